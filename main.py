@@ -5,7 +5,8 @@ import json
 import random
 import time
 import sys
-from tools.osint import whois_lookup, dns_enumeration, subdomain_bruteforce, port_scaner, banner_identifier, leaks, waybackmachine
+import os
+from tools.osint import whois_lookup, dns_enumeration, subdomain_bruteforce, port_scaner, udp_scaner, banner_identifier, fingerprint_cache, leaks, waybackmachine
 from tools.web import scraper, xss
 import asyncio
 
@@ -54,16 +55,36 @@ while True:
                 clear_screen=False
             ).show()
             if osint_menu == 0:
-                osint_domen_whois = input("домен сайта -> ")
-                print(whois_lookup.whois_lookup(osint_domen_whois))
+                osint_domen_whois = input("домен сайта (несколько через запятую или @файл) -> ").strip()
+                if osint_domen_whois.startswith("@") or "," in osint_domen_whois:
+                    from datetime import datetime
+                    
+                    filename = f"results/whois_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl"
+                    os.makedirs("results", exist_ok=True)
+                    try:
+                        results = whois_lookup.run_bulk_lookup(osint_domen_whois, output=filename)
+                    except OSError as e:
+                        print(f"не удалось прочитать список доменов: {e}")
+                        input()
+                        continue
+                    print(f"\nобработано доменов: {len(results)}, ошибок: {sum(1 for r in results if r['error'])}")
+                    print(f"результаты сохранены в {filename}")
+                else:
+                    print(whois_lookup.whois_lookup(osint_domen_whois))
                 input("")
             elif osint_menu == 1:
                 osint_domen_dns = input("домен сайта(без https://) -> ")
                 dns_enumeration.print_dns_results(dns_enumeration.dns_enum(osint_domen_dns), osint_domen_dns)
             elif osint_menu == 2:
                 osint_domen_brute = input("домен сайта(без https://) -> ")
+                osint_brute_wordlist = input("путь к словарю (enter - встроенный список) -> ").strip() or None
+                if osint_brute_wordlist and not os.path.isfile(osint_brute_wordlist):
+                    print(f"словарь не найден: {osint_brute_wordlist}")
+                    input("")
+                    continue
+                osint_brute_permutations = input("перебрать перестановки найденных имен (dev-api, api2, staging.api)? (y/n) -> ").lower() == 'y'
                 try:
-                    results = subdomain_bruteforce.run_bruteforce(osint_domen_brute)
+                    results = subdomain_bruteforce.run_bruteforce(osint_domen_brute, osint_brute_wordlist, osint_brute_permutations)
                     
                     save = input("сохранить результаты в файл? (y/n) -> ").lower()
                     if save == 'y':
@@ -86,26 +107,87 @@ while True:
                     print(f"ошибка: {e}")
                 input("")
             elif osint_menu == 3:
-                osint_domen_portscan = input("введите IP сайта или домен -> ")
+                osint_domen_portscan = input("введите IP, домен, CIDR, диапазон или @файл с целями -> ")
                 osint_domen_portscan_ports = input("введите кол-во портов(1-1024) -> ")
-                osint_domen_portscan_banners = int(input("включить баннеры?(1- да, 2 - нет) -> "))
-                if osint_domen_portscan_banners == 1:
-                    osint_domen_portscan_banners_status = True
+                osint_domen_portscan_proto = input("протокол (1 - tcp, 2 - udp) -> ").strip()
+                if osint_domen_portscan_proto == "2":
+                    def print_udp_port(port_info):
+                        print(f"  [+] {port_info['port']}/udp - {port_info['service']}")
+
+                    results = udp_scaner.run_udp_scanner(osint_domen_portscan, osint_domen_portscan_ports, on_open=print_udp_port)
+                    if "error" in results:
+                        print(results["error"])
+                    else:
+                        print(f"сканирование {results['target']} (udp)")
+                        print(f"время: {results['scan_time']:.2f} сек")
+                        print(f"портов: {results['total_ports']}")
+                        print(f"открыто: {results['open_ports_count']}")
+                        print(f"закрыто: {results['closed_count']}, open|filtered: {results['open_filtered_count']}")
+                    input()
                 else:
-                    osint_domen_portscan_banners_status = False
-                results = port_scaner.run_scanner(osint_domen_portscan, osint_domen_portscan_ports, 1024, osint_domen_portscan_banners_status)
+                    osint_domen_portscan_banners = int(input("включить баннеры?(1- да, 2 - нет) -> "))
+                    if osint_domen_portscan_banners == 1:
+                        osint_domen_portscan_banners_status = True
+                    else:
+                        osint_domen_portscan_banners_status = False
 
-                print(f"сканирование {results['target']}")
-                print(f"время: {results['scan_time']:.2f} сек")
-                print(f"портов: {results['total_ports']}")
-                print(f"открыто: {results['open_ports_count']}")
+                    if port_scaner.is_multi_target(osint_domen_portscan):
+                        def print_host_port(host, port_info):
+                            print(f"  [+] {host['resolved_ip']}:{port_info['port']} - {port_info['service']}")
 
-                input()
-                for port_info in results["open_ports"]:
-                    print(f"{port_info['port']} - {port_info['service']}")
-                    if port_info['banner']:
-                        print(f"  баннер: {port_info['banner'][:50]}")
-                input()
+                        def print_host_done(host):
+                            if host.get("error"):
+                                print(f"  [-] {host['error']}")
+                            elif host["open_ports"]:
+                                print(f"  [=] {host['target']}: открыто {host['open_ports_count']} из {host['total_ports']}")
+
+                        try:
+                            results = port_scaner.run_multi_scanner(osint_domen_portscan, osint_domen_portscan_ports, None, 64, osint_domen_portscan_banners_status, on_open=print_host_port, on_host_done=print_host_done)
+                        except OSError as e:
+                            print(f"не удалось прочитать список целей: {e}")
+                            input()
+                            continue
+
+                        print(f"время: {results['scan_time']:.2f} сек")
+                        print(f"хостов: {results['total_hosts']}")
+                        print(f"хостов с открытыми портами: {results['hosts_with_open_ports']}")
+                        print(f"открыто: {results['open_ports_count']}")
+                        input()
+                    else:
+                        def print_open_port(port_info):
+                            print(f"  [+] {port_info['port']} - {port_info['service']}")
+
+                        checkpoint_path = f"results/portscan_{osint_domen_portscan}.json"
+                        resume = False
+                        saved_state = port_scaner.load_checkpoint(checkpoint_path, osint_domen_portscan, osint_domen_portscan_ports)
+                        if saved_state and not saved_state["finished"]:
+                            resume = input("найдено прерванное сканирование, продолжить? (y/n) -> ").lower() == 'y'
+
+                        # кэш отпечатков нужен только вместе с баннерами
+                        cache = fingerprint_cache.FingerprintCache() if osint_domen_portscan_banners_status else None
+                        try:
+                            results = port_scaner.run_scanner(osint_domen_portscan, osint_domen_portscan_ports, None, osint_domen_portscan_banners_status, on_open=print_open_port, checkpoint=checkpoint_path, resume=resume, cache=cache)
+                        finally:
+                            if cache:
+                                cache.close()
+
+                        print(f"сканирование {results['target']}")
+                        print(f"время: {results['scan_time']:.2f} сек")
+                        print(f"портов: {results['total_ports']}")
+                        print(f"открыто: {results['open_ports_count']}")
+                        if results['cached_banners']:
+                            print(f"баннеров из кэша: {results['cached_banners']}")
+                        if results['changed_services']:
+                            print(f"сервисов изменилось с прошлого раза: {results['changed_services']}")
+                        if results['resource_errors']:
+                            print(f"ошибок локальных ресурсов: {results['resource_errors']} (порты не проверены)")
+
+                        input()
+                        for port_info in results["open_ports"]:
+                            print(f"{port_info['port']} - {port_info['service']}")
+                            if port_info['banner']:
+                                print(f"  баннер: {port_info['banner'][:50]}")
+                        input()
             elif osint_menu == 4:
                 results = banner_identifier.run_fast_banner_scan()
                 
@@ -1,163 +1,374 @@
+import asyncio
+import itertools
 import re
-import socket
-import concurrent.futures
+from tools.osint import service_table, service_probes, fingerprint_cache, tls_probe, port_spec, port_scaner
 
-def identify_service_by_banner(banner):
-    if not banner:
-        return "unknown"
-    
-    banner_lower = banner.lower()
-    
-    service_patterns = {
-        "ssh": ["ssh", "openssh", "dropbear", "libssh", "twisted"],
-        "ftp": ["ftp", "vsftpd", "proftpd", "pure-ftpd", "filezilla", "220-", "230 login"],
-        "smtp": ["smtp", "esmtp", "postfix", "exim", "sendmail", "microsoft esmtp"],
-        "http": ["http/", "apache", "nginx", "iis", "server:", "microsoft-httpapi", "lighttpd", "caddy"],
-        "https": ["http/", "ssl", "tls", "cloudflare"],
-        "telnet": ["telnet", "login:", "password:"],
-        "mysql": ["mysql", "mariadb", "5.7.", "8.0.", "native password"],
-        "postgresql": ["postgresql"],
-        "redis": ["redis", "-err wrong number"],
-        "mongodb": ["mongodb"],
-        "elasticsearch": ["elasticsearch"],
-        "vnc": ["vnc", "tigervnc", "tightvnc", "rfb "],
-        "rdp": ["microsoft terminal services", "rdp", "credssp"],
-        "samba": ["samba", "netbios", "samba smbd"],
-        "docker": ["docker"],
-        "kubernetes": ["kubernetes"],
-        "nginx": ["nginx/"],
-        "apache": ["apache/", "httpd"],
-        "iis": ["microsoft-iis", "internet information services"],
-        "tomcat": ["apache-tomcat", "tomcat"],
-        "jenkins": ["jenkins", "x-jenkins"],
-        "gitlab": ["gitlab", "_gitlab_session"],
-        "wordpress": ["wordpress", "wp-", "xmlrpc.php"],
-        "php": ["php/", "x-powered-by: php"],
-        "nodejs": ["x-powered-by: express", "node.js"],
-        "python": ["python/", "django", "flask"],
-        "prometheus": ["prometheus"],
-        "grafana": ["grafana"],
-        "zabbix": ["zabbix"],
-        "squid": ["squid", "proxy-agent: squid"],
-        "haproxy": ["haproxy"],
-        "irc": ["irc", "welcome to the irc"],
-        "ldap": ["ldap", "389"],
-        "snmp": ["snmp", "public", "private"],
-        "oracle": ["oracle", "tns"],
-        "sql server": ["sql server", "microsoft sql server"],
-        "rabbitmq": ["rabbitmq", "amqp"],
-        "memcached": ["memcached"],
-        "cassandra": ["cassandra"],
-        "couchdb": ["couchdb"],
-    }
+SERVICE_PATTERNS = {
+    "ssh": ["ssh", "openssh", "dropbear", "libssh", "twisted"],
+    "ftp": ["ftp", "vsftpd", "proftpd", "pure-ftpd", "filezilla", "220-", "230 login"],
+    "smtp": ["smtp", "esmtp", "postfix", "exim", "sendmail", "microsoft esmtp"],
+    "http": ["http/", "apache", "nginx", "iis", "server:", "microsoft-httpapi", "lighttpd", "caddy"],
+    "https": ["ssl", "tls", "cloudflare"],
+    "telnet": ["telnet", "login:", "password:"],
+    "mysql": ["mysql", "mariadb", "5.7.", "8.0.", "native password"],
+    "postgresql": ["postgresql"],
+    "redis": ["redis", "-err wrong number"],
+    "mongodb": ["mongodb"],
+    "elasticsearch": ["elasticsearch"],
+    "vnc": ["vnc", "tigervnc", "tightvnc", "rfb "],
+    "rdp": ["microsoft terminal services", "rdp", "credssp"],
+    "samba": ["samba", "netbios", "samba smbd"],
+    "docker": ["docker"],
+    "kubernetes": ["kubernetes"],
+    "nginx": ["nginx/"],
+    "apache": ["apache/", "httpd"],
+    "iis": ["microsoft-iis", "internet information services"],
+    "tomcat": ["apache-tomcat", "tomcat"],
+    "jenkins": ["jenkins", "x-jenkins"],
+    "gitlab": ["gitlab", "_gitlab_session"],
+    "wordpress": ["wordpress", "wp-", "xmlrpc.php"],
+    "php": ["php/", "x-powered-by: php"],
+    "nodejs": ["x-powered-by: express", "node.js"],
+    "python": ["python/", "django", "flask"],
+    "prometheus": ["prometheus"],
+    "grafana": ["grafana"],
+    "zabbix": ["zabbix"],
+    "squid": ["squid", "proxy-agent: squid"],
+    "haproxy": ["haproxy"],
+    "irc": ["irc", "welcome to the irc"],
+    "ldap": ["ldap", "389"],
+    "snmp": ["snmp", "public", "private"],
+    "oracle": ["oracle", "tns"],
+    "sql server": ["sql server", "microsoft sql server"],
+    "rabbitmq": ["rabbitmq", "amqp"],
+    "memcached": ["memcached"],
+    "cassandra": ["cassandra"],
+    "couchdb": ["couchdb"],
+}
+
+# чем конкретнее сервис, тем выше приоритет: приложение > продукт > протокол
+SERVICE_PRIORITY = {
+    "jenkins": 3, "gitlab": 3, "wordpress": 3, "grafana": 3, "prometheus": 3, "zabbix": 3,
+    "php": 3, "nodejs": 3, "python": 3, "kubernetes": 3, "docker": 3,
+    "nginx": 2, "apache": 2, "iis": 2, "tomcat": 2, "squid": 2, "haproxy": 2,
+    "mysql": 2, "postgresql": 2, "redis": 2, "mongodb": 2, "elasticsearch": 2, "oracle": 2,
+    "sql server": 2, "rabbitmq": 2, "memcached": 2, "cassandra": 2, "couchdb": 2, "samba": 2,
+}
+
+# короткие и общие подстроки встречаются в чужих баннерах, им доверяем меньше
+WEAK_PATTERNS = {"server:", "220-", "login:", "password:", "5.7.", "8.0.", "389", "public", "private",
+                 "tns", "wp-", "iis", "rdp", "irc", "ssl", "tls", "httpd", "twisted", "amqp", "rfb "}
+
+# ниже порога совпадение считается случайным и уступает любому уверенному
+CONFIDENCE_FLOOR = 0.5
+
+_matcher = None
+
+def pattern_weight(pattern):
+    if pattern in WEAK_PATTERNS:
+        return 0.25
+    if pattern.endswith("/") or len(pattern) >= 8:
+        return 0.9
+    return 0.6
+
+def trie_regex(words):
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = True
+    
+    def emit(node):
+        alternatives = [re.escape(char) + emit(child) for char, child in sorted(node.items()) if char]
+        if not alternatives:
+            return ""
+        body = alternatives[0] if len(alternatives) == 1 else "(?:" + "|".join(alternatives) + ")"
+        return "(?:" + body + ")?" if "" in node else body
     
-    for service, patterns in service_patterns.items():
+    return emit(trie)
+
+def build_matcher():
+    # все подстроки собираются в один регэксп-trie внутри lookahead, поэтому за один проход по баннеру
+    # находится самый длинный шаблон в каждой позиции; более короткие шаблоны в той же позиции - его префиксы
+    outputs = {}
+    for service, patterns in SERVICE_PATTERNS.items():
         for pattern in patterns:
-            if pattern in banner_lower:
-                return service
+            outputs.setdefault(pattern, []).append((service, pattern_weight(pattern)))
+    
+    prefixed = {}
+    for pattern in outputs:
+        prefixed[pattern] = [(p, service, weight) for p in outputs if pattern.startswith(p) for service, weight in outputs[p]]
     
-    return "unknown"
+    regex = re.compile("(?=(" + trie_regex(outputs) + "))")
+    return regex, prefixed
 
-def get_banner_from_port(host, port, timeout=1):
-    try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(timeout)
-        sock.connect((host, port))
-        
-        if port in [80, 443, 8080, 8443, 8888]:
-            sock.send(b"HEAD / HTTP/1.0\r\n\r\n")
-        elif port == 21:
-            sock.send(b"\r\n")
-        elif port in [22, 2222]:
-            sock.send(b"SSH-2.0-Test\r\n")
-        elif port == 25:
-            sock.send(b"EHLO test\r\n")
-        elif port == 3306:
-            sock.send(b"\x00\x00\x00\x0a\x00\x00\x00\x00\x00\x00\x00\x00")
-        else:
-            sock.send(b"\r\n\x00\r\n")
-        
-        banner = sock.recv(512).decode('utf-8', errors='ignore').strip()
-        sock.close()
-        
-        return banner if banner and len(banner) > 2 else None
-    except:
+def get_matcher():
+    global _matcher
+    if _matcher is None:
+        _matcher = build_matcher()
+    return _matcher
+
+def identify_services(banner):
+    if not banner:
+        return []
+    
+    regex, prefixed = get_matcher()
+    found = {}
+    for hit in set(regex.findall(banner.lower())):
+        for pattern, service, weight in prefixed[hit]:
+            found.setdefault(service, {})[pattern] = weight
+    
+    services = []
+    for service, patterns in found.items():
+        miss = 1.0
+        for weight in patterns.values():
+            miss *= 1 - weight
+        services.append({
+            "service": service,
+            "priority": SERVICE_PRIORITY.get(service, 1),
+            "confidence": round(1 - miss, 3),
+            "patterns": sorted(patterns)
+        })
+    
+    # среди уверенных совпадений побеждает самый конкретный сервис: nginx, а не http, даже если
+    # у протокола больше подходящих подстрок; уверенность решает внутри одного приоритета
+    services.sort(key=lambda s: (s["confidence"] < CONFIDENCE_FLOOR, -s["priority"], -s["confidence"]))
+    return services
+
+def identify_service_by_banner(banner):
+    services = identify_services(banner)
+    return services[0]["service"] if services else "unknown"
+
+def fingerprint_result(target, ip, port, found, banner, service, cached=False):
+    return {
+        "host": target.target,
+        "ip": ip,
+        "port": port,
+        "service": service,
+        "product": found.get("product"),
+        "version": found.get("version"),
+        "info": found.get("info"),
+        "probe": found.get("probe"),
+        "probes_sent": found.get("probes_sent", 0),
+        "cached": cached,
+        "banner": banner[:150]
+    }
+
+async def fingerprint_port(target, ip, port, timeout=1, deadline=3, cache=None):
+    # свежая запись кэша проверяется одной пробой; полный перебор проб - только для устаревших и изменившихся портов
+    entry = cache.get(ip, port) if cache else None
+    if entry:
+        found = await service_probes.reprobe(ip, port, entry["probe"], timeout, deadline)
+        if found is None:
+            cache.forget(ip, port)
+            return None
+        if fingerprint_cache.same_fingerprint(found, entry):
+            return fingerprint_result(target, ip, port, dict(entry, probes_sent=1), entry["banner"], entry["service"], cached=True)
+    
+    found = await service_probes.probe_service(ip, port, timeout, deadline)
+    banner = found["banner"].decode('utf-8', errors='ignore').strip() if found else ""
+    if not found or (not found["service"] and len(banner) <= 2):
+        if cache:
+            cache.forget(ip, port)
         return None
+    
+    # уверенное правило из базы проб главнее подстрок; softmatch - только если подстроки ничего не дали
+    service = found["service"] if found["confident"] else identify_service_by_banner(banner)
+    if service == "unknown":
+        service = found["service"] or service_table.service_name(port)
+    
+    result = fingerprint_result(target, ip, port, found, banner, service)
+    if cache:
+        cache.put(ip, port, "tcp", result["banner"], service, result["product"], result["version"], result["info"], result["probe"])
+    return result
 
-def scan_port_for_banner(host, port):
-    try:
-        ip = socket.gethostbyname(host)
-    except:
+async def scan_port_for_banner(target, ip, port, timeout=1, deadline=3, cache=None, tls_store=None):
+    # tls-стадия идет в той же задаче, поэтому укладывается в общее окно max_concurrent
+    result = await fingerprint_port(target, ip, port, timeout, deadline, cache)
+    if tls_store is None:
+        return result
+    if result is None and port not in tls_probe.TLS_PORTS:
         return None
+    if result is not None and result["service"] not in tls_probe.TLS_SERVICES:
+        return result
     
-    banner = get_banner_from_port(ip, port)
+    tls = await tls_probe.tls_probe(ip, port, tls_probe.server_name_for(target.target), deadline, tls_store)
+    if tls is None:
+        return result
     
-    if banner:
-        service = identify_service_by_banner(banner)
-        return {
-            "host": host,
-            "ip": ip,
-            "port": port,
-            "service": service,
-            "banner": banner[:150]
-        }
+    if result is None:
+        result = fingerprint_result(target, ip, port, {}, "", "ssl")
+    if result["service"] == "ssl" and service_table.service_name(port) != "unknown":
+        result["service"] = service_table.service_name(port)
+    result["tls"] = tls
+    return result
+
+async def iter_banner_scan(target, ports, max_concurrent=None, timeout=1, deadline=3, all_addresses=False, cache=None, tls_store=None):
+    # цель разрешается один раз на весь скан; окно из max_concurrent проб, результаты отдаются по мере готовности
+    if isinstance(target, str):
+        target = await port_scaner.resolve_addresses(target)
+        if target is None:
+            return
     
-    return None
+    max_concurrent = port_scaner.auto_concurrency(max_concurrent)
+    probes = ((ip, port) for ip in target.scan_addresses(all_addresses) for port in ports)
+    pending = {asyncio.create_task(scan_port_for_banner(target, ip, port, timeout, deadline, cache, tls_store)) for ip, port in itertools.islice(probes, max_concurrent)}
+    
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for ip, port in itertools.islice(probes, len(done)):
+                pending.add(asyncio.create_task(scan_port_for_banner(target, ip, port, timeout, deadline, cache, tls_store)))
+            
+            for task in done:
+                result = task.result()
+                if result:
+                    yield result
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+async def banner_scan(target, ports, max_concurrent=None, timeout=1, deadline=3, on_result=None, all_addresses=False, cache=None, tls_store=None):
+    results = []
+    try:
+        async for result in iter_banner_scan(target, ports, max_concurrent, timeout, deadline, all_addresses, cache, tls_store):
+            results.append(result)
+            if on_result:
+                on_result(result)
+    finally:
+        if cache:
+            cache.commit()
+    return results
+
+def describe_service(result):
+    product = " ".join(filter(None, [result.get("product"), result.get("version")]))
+    return f"{result['service']} ({product})" if product else result["service"]
 
-def run_fast_banner_scan():
+def print_banner_result(result):
+    port = result["port"]
+    service = describe_service(result)
+    banner_preview = result["banner"][:40].replace("\n", " ").replace("\r", "")
+    cached = " [кэш]" if result.get("cached") else ""
+    tls = result.get("tls")
+    if tls:
+        banner_preview = f"{tls['version']} {tls['cipher']}"
+    print(f"  [+] {result['ip']} порт {port}: {service}{cached} - {banner_preview}...")
+
+def print_tls_result(tls):
+    print(f"  tls: {tls['version']}, {tls['cipher']} ({tls['bits']} бит)")
+    certificate = tls["certificate"]
+    if not certificate or certificate.get("error"):
+        return
+    flags = [flag for flag, on in (("самоподписанный", certificate["self_signed"]), ("просрочен", certificate["expired"])) if on]
+    print(f"  сертификат: CN={certificate['common_name']}, издатель: {certificate['issuer_name']}{' (' + ', '.join(flags) + ')' if flags else ''}")
+    print(f"  действителен: {certificate['not_before']} - {certificate['not_after']}")
+    if certificate["sans"]:
+        print(f"  SAN: {', '.join(certificate['sans'][:10])}{' ...' if len(certificate['sans']) > 10 else ''}")
+
+def run_fast_banner_scan(max_concurrent=None, deadline=5, cache_path=fingerprint_cache.DEFAULT_PATH, cache_ttl=fingerprint_cache.DEFAULT_TTL):
     host = input("введите IP или домен -> ").strip()
     
     print("\nформат портов:")
     print("1. один порт: 80")
     print("2. диапазон: 20-25")
-    print("3. список: 80,443,8080")
+    print("3. список или смесь: 22,80,443,8000-9000,web,top100,!8080")
     print("4. быстро сканировать 50 популярных портов")
     
     choice = input("выберите вариант (1-4) -> ").strip()
     
     if choice == "4":
-        ports = [21, 22, 23, 25, 53, 80, 110, 111, 135, 139, 143, 443, 445, 993, 995, 
-                1723, 3306, 3389, 5900, 8080, 8443, 8888, 9000, 9001, 27017, 27018,
-                5432, 6379, 9200, 11211, 2049, 2375, 2376, 3000, 5000, 5432, 5672,
-                5984, 6379, 7474, 7687, 8000, 8008, 8081, 8090, 8181, 8200, 8300,
-                8500, 9200, 9300, 11211, 27017, 28017, 50000]
+        ports = port_spec.parse_ports("popular")
         print(f"сканирую {len(ports)} популярных портов...")
     else:
         ports_input = input("введите порт(ы) -> ").strip()
-        if "-" in ports_input:
-            start, end = map(int, ports_input.split("-"))
-            ports = list(range(start, end + 1))
-        elif "," in ports_input:
-            ports = [int(p.strip()) for p in ports_input.split(",")]
-        else:
-            ports = [int(ports_input)]
+        ports = port_spec.parse_ports(ports_input)
+    
+    target = asyncio.run(port_scaner.resolve_addresses(host))
+    if target is None:
+        print(f"не удалось разрешить домен: {host}")
+        return []
+    
+    all_addresses = False
+    if len(target.addresses) > 1:
+        print(f"адреса {host}: {', '.join(target.addresses)}")
+        all_addresses = input("сканировать все адреса? (y/n) -> ").lower() == 'y'
     
     print(f"сканирую {len(ports)} порт(ов) на {host}...")
     print("ожидайте...\n")
     
-    results = []
+    tls_store = tls_probe.CertificateStore()
+    with fingerprint_cache.FingerprintCache(cache_path, cache_ttl) as cache:
+        results = asyncio.run(banner_scan(target, ports, max_concurrent, deadline=deadline, on_result=print_banner_result, all_addresses=all_addresses, cache=cache, tls_store=tls_store))
     
-    with concurrent.futures.ThreadPoolExecutor(max_workers=100) as executor:
-        future_to_port = {executor.submit(scan_port_for_banner, host, port): port for port in ports}
-        
-        for future in concurrent.futures.as_completed(future_to_port):
-            result = future.result()
-            if result:
-                results.append(result)
-                port = result["port"]
-                service = result["service"]
-                banner_preview = result["banner"][:40].replace("\n", " ").replace("\r", "")
-                print(f"  [+] порт {port}: {service} - {banner_preview}...")
+    cached = sum(1 for r in results if r["cached"])
+    if cached:
+        print(f"\nиз кэша отпечатков: {cached} из {len(results)} (записи моложе {cache_ttl // 3600} ч)")
     
     if results:
-        print(f"\nнайдено {len(results)} портов с баннерами:")
+        probes_sent = sum(r["probes_sent"] for r in results)
+        print(f"\nнайдено {len(results)} портов с баннерами (в среднем {probes_sent / len(results):.1f} проб на порт):")
         print("-" * 70)
         
-        for result in sorted(results, key=lambda x: x["port"]):
-            print(f"порт {result['port']} ({result['service']}):")
-            print(f"  {result['banner'][:120]}")
+        for result in sorted(results, key=lambda x: (x["ip"], x["port"])):
+            print(f"{result['ip']} порт {result['port']} - {describe_service(result)}:")
+            if result.get("info"):
+                print(f"  {result['info']}")
+            if result["banner"]:
+                print(f"  {result['banner'][:120]}")
+            if result.get("tls"):
+                print_tls_result(result["tls"])
             print()
     else:
         print("порты с баннерами не найдены")
     
-    return results
\ No newline at end of file
+    if tls_store.certificates:
+        print(f"уникальных сертификатов: {len(tls_store.certificates)}")
+    hostnames = tls_store.new_hostnames([host])
+    if hostnames:
+        print(f"новые имена из сертификатов ({len(hostnames)}): {', '.join(hostnames[:20])}")
+    
+    return results
+
+BANNER_CORPUS = [
+    "SSH-2.0-OpenSSH_8.9p1 Ubuntu-3ubuntu0.6",
+    "SSH-2.0-dropbear_2020.81",
+    "220 (vsFTPd 3.0.3)",
+    "220 ProFTPD Server (Debian) [::ffff:10.0.0.5]",
+    "220-FileZilla Server 1.7.2\r\n220 Please visit https://filezilla-project.org/",
+    "220 mail.example.com ESMTP Postfix (Ubuntu)",
+    "220 mx.example.org ESMTP Exim 4.96 Mon, 02 Oct 2023 10:00:00 +0000",
+    "HTTP/1.1 200 OK\r\nServer: nginx/1.18.0 (Ubuntu)\r\nContent-Type: text/html",
+    "HTTP/1.1 400 Bad Request\r\nServer: Apache/2.4.41 (Ubuntu)\r\nContent-Length: 301",
+    "HTTP/1.1 200 OK\r\nServer: Microsoft-IIS/10.0\r\nX-Powered-By: ASP.NET",
+    "HTTP/1.1 403 Forbidden\r\nServer: Jetty(9.4.z)\r\nX-Jenkins: 2.401.3",
+    "HTTP/1.1 200 OK\r\nX-Powered-By: Express\r\nContent-Type: application/json",
+    "HTTP/1.0 200 OK\r\nServer: SimpleHTTP/0.6 Python/3.10.12",
+    "-ERR wrong number of arguments for 'get' command",
+    "J\x00\x00\x00\n8.0.33\x00mysql_native_password",
+    "RFB 003.008",
+    "* OK [CAPABILITY IMAP4rev1 LITERAL+ SASL-IR] Dovecot ready.",
+    "+OK Dovecot ready.",
+    "HTTP/1.1 200 OK\r\nServer: squid/5.7\r\nX-Squid-Error: ERR_INVALID_URL 0",
+    "HTTP/1.1 302 Found\r\nLocation: /login\r\nSet-Cookie: grafana_session=abc",
+]
+
+def benchmark_banner_matcher(rounds=2000, corpus=None):
+    import timeit
+    
+    corpus = corpus or BANNER_CORPUS
+    
+    def nested_loops(banner):
+        banner_lower = banner.lower()
+        return [service for service, patterns in SERVICE_PATTERNS.items() for pattern in patterns if pattern in banner_lower]
+    
+    get_matcher()
+    results = {}
+    for name, func in [("вложенные циклы", nested_loops), ("автомат", identify_services)]:
+        total = timeit.timeit(lambda: [func(b) for b in corpus], number=rounds)
+        results[name] = total / (rounds * len(corpus)) * 1e6
+        print(f"{name}: {results[name]:.2f} мкс на баннер")
+    
+    return results
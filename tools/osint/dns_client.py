@@ -0,0 +1,266 @@
+import asyncio
+import itertools
+import random
+import socket
+import struct
+import time
+import dns.asyncquery
+import dns.exception
+import dns.message
+import dns.name
+import dns.rcode
+import dns.rdatatype
+import dns.resolver
+
+FALLBACK_NAMESERVERS = ['8.8.8.8', '1.1.1.1']
+EDNS_PAYLOAD = 1232
+# opt-запись edns0: ответы до 1232 байт приходят по udp без обрезки
+EDNS_OPT = b"\x00" + struct.pack("!HHIH", 41, EDNS_PAYLOAD, 0, 0)
+FLAG_RD = 0x0100
+FLAG_TC = 0x0200
+RETRY_RCODES = {dns.rcode.SERVFAIL, dns.rcode.REFUSED}
+RECEIVE_BUFFER = 1 << 20
+
+HEALTH_ALPHA = 0.2
+HEALTH_MIN_SAMPLES = 20
+HEALTH_DROP_FAILURE = 0.5
+HEALTH_COOLDOWN = 30
+
+def system_nameservers():
+    try:
+        return dns.resolver.Resolver(configure=True).nameservers or FALLBACK_NAMESERVERS
+    except dns.exception.DNSException:
+        return FALLBACK_NAMESERVERS
+
+def encode_question(name, rdtype):
+    return dns.name.from_text(name).to_wire() + struct.pack("!HH", dns.rdatatype.from_text(rdtype) if isinstance(rdtype, str) else rdtype, 1)
+
+def encode_query(qid, question):
+    return struct.pack("!HHHHHH", qid, FLAG_RD, 1, 0, 0, 1) + question + EDNS_OPT
+
+class ResolverHealth:
+    # скользящие средние задержки и доли отказов (таймаут, servfail/refused); вес резолвера - обратная стоимость ответа
+    def __init__(self, address, port=53, timeout=2):
+        self.address = address
+        self.port = port
+        self.family = socket.AF_INET6 if ":" in address else socket.AF_INET
+        self.latency = timeout / 4
+        self.failure = 0.0
+        self.sent = 0
+        self.answered = 0
+        self.timeouts = 0
+        self.servfails = 0
+        self.disabled_until = 0
+    
+    @property
+    def weight(self):
+        return 1 / (self.latency * (1 + 10 * self.failure))
+    
+    def available(self, now):
+        return self.disabled_until <= now
+    
+    def record_answer(self, latency):
+        self.answered += 1
+        self.latency += HEALTH_ALPHA * (latency - self.latency)
+        self.failure *= 1 - HEALTH_ALPHA
+    
+    def record_failure(self, timeout=False):
+        if timeout:
+            self.timeouts += 1
+        else:
+            self.servfails += 1
+        self.failure += HEALTH_ALPHA * (1 - self.failure)
+        # резолвер, который стабильно не отвечает, выводится из ротации на время, потом пробуется заново
+        if self.sent >= HEALTH_MIN_SAMPLES and self.failure > HEALTH_DROP_FAILURE:
+            self.disabled_until = time.monotonic() + HEALTH_COOLDOWN
+            self.failure = HEALTH_DROP_FAILURE / 2
+    
+    def line(self):
+        state = "отключен" if not self.available(time.monotonic()) else f"вес {self.weight:.1f}"
+        return (f"{self.address}: {state}, задержка {self.latency * 1000:.0f} мс, отправлено {self.sent}, "
+                f"ответов {self.answered}, таймаутов {self.timeouts}, servfail {self.servfails}")
+
+class ResolverPool:
+    def __init__(self, nameservers=None, port=53, timeout=2):
+        self.resolvers = [ResolverHealth(address, port, timeout) for address in nameservers or system_nameservers()]
+    
+    def pick(self, exclude=()):
+        # случайный выбор с весами: быстрые и надежные получают больше запросов, остальные - немного, чтобы оценка обновлялась
+        now = time.monotonic()
+        candidates = [r for r in self.resolvers if r.available(now) and r not in exclude]
+        if not candidates:
+            candidates = [r for r in self.resolvers if r not in exclude] or self.resolvers
+            return min(candidates, key=lambda r: r.disabled_until)
+        if len(candidates) == 1:
+            return candidates[0]
+        return random.choices(candidates, weights=[r.weight for r in candidates])[0]
+    
+    def lines(self):
+        return [r.line() for r in self.resolvers]
+
+class DnsClientProtocol(asyncio.DatagramProtocol):
+    def __init__(self, client, index):
+        self.client = client
+        self.index = index
+    
+    def datagram_received(self, data, addr):
+        self.client.reply_received(self.index, data, addr)
+    
+    def error_received(self, exc):
+        pass
+
+class UdpDnsClient:
+    # тысячи одновременных запросов идут через несколько udp-сокетов, ответ находит свой запрос по (сокет, id);
+    # адрес отправителя и секция вопроса сверяются, чужие и опоздавшие датаграммы отбрасываются
+    def __init__(self, nameservers=None, port=53, timeout=2, retries=2, sockets=4, max_outstanding=4096):
+        self.pool = ResolverPool(nameservers, port, timeout)
+        self.timeout = timeout
+        self.retries = retries
+        self.sockets = sockets
+        self.outstanding = asyncio.Semaphore(max_outstanding)
+        self.transports = []
+        self.cycles = {}
+        self.pending = {}
+        self.opening = None
+    
+    async def __aenter__(self):
+        await self.open()
+        return self
+    
+    async def __aexit__(self, *exc):
+        self.close()
+    
+    async def open(self):
+        # сокеты открываются при первом запросе, уже внутри цикла событий
+        if self.opening is None:
+            self.opening = asyncio.ensure_future(self.open_sockets())
+        await self.opening
+    
+    async def open_sockets(self):
+        # свой набор сокетов на каждое семейство адресов, которое встречается среди резолверов
+        loop = asyncio.get_running_loop()
+        families = {r.family for r in self.pool.resolvers}
+        for family in sorted(families):
+            indices = []
+            for _ in range(self.sockets):
+                index = len(self.transports)
+                transport, _ = await loop.create_datagram_endpoint(lambda index=index: DnsClientProtocol(self, index), family=family,
+                                                                   local_addr=("::" if family == socket.AF_INET6 else "0.0.0.0", 0))
+                try:
+                    # буфер приема побольше: при пачке ответов на тысячи запросов стандартный переполняется и ядро молча их теряет
+                    transport.get_extra_info("socket").setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_BUFFER)
+                except OSError:
+                    pass
+                self.transports.append(transport)
+                indices.append(index)
+            self.cycles[family] = itertools.cycle(indices)
+    
+    def close(self):
+        for transport in self.transports:
+            transport.close()
+        self.transports = []
+        self.cycles = {}
+        self.opening = None
+        for future, _, _ in self.pending.values():
+            if not future.done():
+                future.cancel()
+        self.pending.clear()
+    
+    def reply_received(self, index, data, addr):
+        if len(data) < 12:
+            return
+        entry = self.pending.get((index, data[0] << 8 | data[1]))
+        if entry is None:
+            return
+        future, question, resolver = entry
+        if addr[0] != resolver.address or addr[1] != resolver.port or data[12:12 + len(question)].lower() != question.lower():
+            return
+        if not future.done():
+            future.set_result(data)
+    
+    async def send(self, resolver, question):
+        index = next(self.cycles[resolver.family])
+        qid = random.randrange(65536)
+        while (index, qid) in self.pending:
+            qid = random.randrange(65536)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[(index, qid)] = (future, question, resolver)
+        resolver.sent += 1
+        started = time.monotonic()
+        try:
+            self.transports[index].sendto(encode_query(qid, question), (resolver.address, resolver.port))
+            data = await asyncio.wait_for(future, self.timeout)
+        finally:
+            self.pending.pop((index, qid), None)
+        return data, time.monotonic() - started
+    
+    async def query(self, name, rdtype="A"):
+        # повтор после таймаута или servfail/refused идет к другому резолверу; nxdomain и пустой ответ окончательны.
+        # при исчерпании попыток возвращается последний ответ с ошибкой, если его не было - asyncio.TimeoutError
+        await self.open()
+        question = encode_question(name, rdtype)
+        tried = []
+        response = None
+        async with self.outstanding:
+            for _ in range(self.retries + 1):
+                resolver = self.pool.pick(tried)
+                tried.append(resolver)
+                try:
+                    data, latency = await self.send(resolver, question)
+                except asyncio.TimeoutError:
+                    resolver.record_failure(timeout=True)
+                    continue
+                except OSError:
+                    resolver.record_failure()
+                    continue
+                
+                try:
+                    message = dns.message.from_wire(data)
+                except dns.exception.DNSException:
+                    resolver.record_failure()
+                    continue
+                if message.rcode() in RETRY_RCODES:
+                    resolver.record_failure()
+                    response = message
+                    continue
+                resolver.record_answer(latency)
+                if message.flags & FLAG_TC:
+                    # обрезанный ответ (большой txt) переспрашиваем по tcp у того же резолвера
+                    request = dns.message.make_query(name, rdtype)
+                    message = await dns.asyncquery.tcp(request, resolver.address, timeout=self.timeout, port=resolver.port)
+                return message
+        if response is None:
+            raise asyncio.TimeoutError(f"нет ответа на {name} {rdtype}")
+        return response
+    
+    async def resolve(self, name, rdtype="A"):
+        # значения записей текстом; [] - имени или записей нет, None - резолверы не ответили
+        try:
+            message = await self.query(name, rdtype)
+        except (asyncio.TimeoutError, OSError, dns.exception.DNSException):
+            return None
+        if message.rcode() == dns.rcode.NXDOMAIN:
+            return []
+        if message.rcode() != dns.rcode.NOERROR:
+            return None
+        wanted = dns.rdatatype.from_text(rdtype) if isinstance(rdtype, str) else rdtype
+        return [r.to_text() for rrset in message.answer if rrset.rdtype == wanted for r in rrset]
+    
+    async def resolve_address(self, name):
+        # как resolve_answer в subdomain_bruteforce: (адреса, цель cname или None) или None
+        try:
+            message = await self.query(name, "A")
+        except (asyncio.TimeoutError, OSError, dns.exception.DNSException):
+            return None
+        if message.rcode() != dns.rcode.NOERROR:
+            return None
+        ips = []
+        cname = None
+        for rrset in message.answer:
+            if rrset.rdtype == dns.rdatatype.A:
+                ips.extend(r.address for r in rrset)
+            elif rrset.rdtype == dns.rdatatype.CNAME:
+                cname = rrset[0].target.to_text().rstrip(".").lower()
+        if not ips and not cname:
+            return None
+        return ips, cname
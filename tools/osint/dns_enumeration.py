@@ -1,64 +1,117 @@
-import socket
-import dns.resolver
+import asyncio
+import dns.asyncquery
+import dns.asyncresolver
+import dns.exception
 import dns.reversename
+import dns.zone
 from rich.console import Console
 from rich.table import Table
 from rich.panel import Panel
 from rich import box
+from tools.osint import dns_client
 
 console = Console()
 
-def dns_enum(domain):
-    results = {}
+NAMESERVERS = ['8.8.8.8', '1.1.1.1']
+RECORD_TYPES = ['A', 'AAAA', 'MX', 'NS', 'TXT', 'SOA', 'CNAME']
+COMMON_SUBDOMAINS = ['www', 'mail', 'ftp', 'admin', 'test', 'dev', 'api', 'blog']
+QUERY_TIMEOUT = 3
+DEADLINE = 10
+
+async def resolve_subdomains(names, nameservers=NAMESERVERS, port=53, timeout=2):
+    # все имена разом через один udp-клиент, ответы сопоставляются по id запроса
+    async with dns_client.UdpDnsClient(nameservers, port, timeout) as client:
+        answers = await asyncio.gather(*(client.resolve(name, 'A') for name in names))
+    return {name: ips for name, ips in zip(names, answers) if ips}
+
+def make_resolver(nameservers=NAMESERVERS, port=53, timeout=QUERY_TIMEOUT):
+    resolver = dns.asyncresolver.Resolver(configure=False)
+    resolver.nameservers = list(nameservers)
+    resolver.port = port
+    resolver.timeout = timeout
+    resolver.lifetime = timeout
+    return resolver
+
+async def query_records(resolver, name, rdtype):
+    # у каждого запроса свой таймаут (lifetime резолвера); нет ответа - пустой список, как раньше
+    try:
+        answer = await resolver.resolve(name, rdtype)
+        return [str(r) for r in answer]
+    except dns.exception.DNSException:
+        return []
+
+async def query_ptr(resolver, ip):
+    answer = await query_records(resolver, dns.reversename.from_address(ip), 'PTR')
+    return answer[0] if answer else "нет ptr записи"
+
+async def try_axfr(domain, ns_names, resolver, port=53, timeout=QUERY_TIMEOUT):
+    # передача зоны запрашивается у всех ns одновременно, хватает первого отдавшего зону
+    async def transfer(address):
+        zone = dns.zone.Zone(domain)
+        await dns.asyncquery.inbound_xfr(address, zone, port=port, timeout=timeout, lifetime=timeout)
+        return [line for name, node in zone.nodes.items() for rdataset in node for line in rdataset.to_text(name, origin=zone.origin, relativize=False).splitlines()]
     
+    addresses = await asyncio.gather(*(query_records(resolver, ns, 'A') for ns in ns_names))
+    tasks = [asyncio.create_task(transfer(address)) for address in {a for found in addresses for a in found}]
     try:
-        resolver = dns.resolver.Resolver()
-        resolver.nameservers = ['8.8.8.8', '1.1.1.1']
-        
-        records = ['A', 'AAAA', 'MX', 'NS', 'TXT', 'SOA', 'CNAME']
-        for rec in records:
-            try:
-                answer = resolver.resolve(domain, rec)
-                results[rec] = [str(r) for r in answer]
-            except:
-                results[rec] = []
-        
-        common_subs = ['www', 'mail', 'ftp', 'admin', 'test', 'dev', 'api', 'blog']
-        found_subs = {}
-        for sub in common_subs:
+        for next_done in asyncio.as_completed(tasks):
             try:
-                target = f"{sub}.{domain}"
-                answer = resolver.resolve(target, 'A')
-                found_subs[target] = [str(r) for r in answer]
-            except:
-                pass
-        results['поддомены'] = found_subs
-        
-        try:
-            ptr_info = {}
-            for ip in results.get('A', []):
-                try:
-                    rev = dns.reversename.from_address(ip)
-                    answer = resolver.resolve(rev, 'PTR')
-                    ptr_info[ip] = str(answer[0])
-                except:
-                    ptr_info[ip] = "нет ptr записи"
-            if ptr_info:
-                results['ptr_записи'] = ptr_info
-        except:
-            pass
-        
-        try:
-            answer = resolver.resolve(domain, 'AXFR')
-            results['axfr_уязвимость'] = [str(r) for r in answer]
-        except:
-            results['axfr_уязвимость'] = "не уязвимо"
-        
-    except Exception as e:
-        results['ошибка'] = str(e)
+                records = await next_done
+            except (dns.exception.DNSException, OSError, EOFError):
+                continue
+            if records:
+                return records
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return "не уязвимо"
+
+async def enumerate_dns(domain, nameservers=NAMESERVERS, port=53, timeout=QUERY_TIMEOUT, deadline=DEADLINE):
+    # все запросы идут одновременно: типы записей, поддомены, ptr (сразу после ответа на A) и axfr (после NS).
+    # результаты складываются по мере готовности, по общему дедлайну незавершенное отменяется, собранное остается
+    results = {rec: [] for rec in RECORD_TYPES}
+    results['поддомены'] = {}
+    results['axfr_уязвимость'] = "не уязвимо"
+    resolver = make_resolver(nameservers, port, timeout)
+    
+    async def records(rec):
+        results[rec] = await query_records(resolver, domain, rec)
+        return results[rec]
+    
+    async def subdomains():
+        results['поддомены'] = await resolve_subdomains([f"{sub}.{domain}" for sub in COMMON_SUBDOMAINS], nameservers, port, timeout)
+    
+    async def ptr_records():
+        ips = await lookups['A']
+        names = await asyncio.gather(*(query_ptr(resolver, ip) for ip in ips))
+        if ips:
+            results['ptr_записи'] = dict(zip(ips, names))
     
+    async def axfr():
+        ns_names = [ns.rstrip(".") for ns in await lookups['NS']]
+        results['axfr_уязвимость'] = await try_axfr(domain, ns_names, resolver, port, timeout)
+    
+    lookups = {rec: asyncio.create_task(records(rec)) for rec in RECORD_TYPES}
+    tasks = list(lookups.values()) + [asyncio.create_task(step()) for step in (subdomains, ptr_records, axfr)]
+    done, pending = await asyncio.wait(tasks, timeout=deadline)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    
+    errors = [task.exception() for task in done if task.exception()]
+    if errors:
+        results['ошибка'] = str(errors[0])
+    elif pending:
+        results['ошибка'] = f"не уложились в {deadline} сек, не завершено запросов: {len(pending)}"
     return results
 
+def dns_enum(domain, nameservers=NAMESERVERS, deadline=DEADLINE):
+    try:
+        return asyncio.run(enumerate_dns(domain, nameservers, deadline=deadline))
+    except Exception as e:
+        return {'ошибка': str(e)}
+
 def print_dns_results(results, domain):
     console.print(Panel.fit(
         f"[bold cyan]DNS перечисление для: {domain}[/bold cyan]",
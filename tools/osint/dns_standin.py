@@ -0,0 +1,91 @@
+import asyncio
+import random
+import dns.exception
+import dns.message
+import dns.name
+import dns.rcode
+import dns.rdatatype
+import dns.rrset
+
+# локальный dns-сервер для бенчмарков и проверок резолверов: отвечает из словаря записей
+# с искусственной задержкой, умеет wildcard (*.zone), servfail и потерю пакетов
+class StandInDnsServer(asyncio.DatagramProtocol):
+    def __init__(self, records=None, delay=0.02, servfail_rate=0, drop_rate=0):
+        self.records = {}
+        for name, entry in (records or {}).items():
+            self.add(name, entry)
+        self.delay = delay
+        self.servfail_rate = servfail_rate
+        self.drop_rate = drop_rate
+        self.transport = None
+        self.queries = 0
+    
+    def add(self, name, entry):
+        # entry: список адресов, строка - цель cname, или словарь тип -> значения
+        if isinstance(entry, str):
+            entry = {"CNAME": [entry]}
+        elif not isinstance(entry, dict):
+            entry = {"A": list(entry)}
+        self.records[name.lower().rstrip(".")] = entry
+    
+    def connection_made(self, transport):
+        self.transport = transport
+    
+    def datagram_received(self, data, addr):
+        self.queries += 1
+        if self.drop_rate and random.random() < self.drop_rate:
+            return
+        try:
+            query = dns.message.from_wire(data)
+        except dns.exception.DNSException:
+            return
+        asyncio.get_running_loop().call_later(self.delay, self.reply, query, addr)
+    
+    def lookup(self, name):
+        entry = self.records.get(name)
+        if entry is not None:
+            return entry
+        labels = name.split(".")
+        for i in range(1, len(labels)):
+            entry = self.records.get("*." + ".".join(labels[i:]))
+            if entry is not None:
+                return entry
+        return None
+    
+    def reply(self, query, addr):
+        if self.transport is None or self.transport.is_closing():
+            return
+        response = dns.message.make_response(query)
+        if self.servfail_rate and random.random() < self.servfail_rate:
+            response.set_rcode(dns.rcode.SERVFAIL)
+            self.transport.sendto(response.to_wire(), addr)
+            return
+        
+        question = query.question[0]
+        rdtype = dns.rdatatype.to_text(question.rdtype)
+        name = question.name
+        entry = self.lookup(name.to_text().lower().rstrip("."))
+        if entry is None:
+            response.set_rcode(dns.rcode.NXDOMAIN)
+        
+        # цепочка cname раскручивается до записи нужного типа, как у рекурсивного резолвера
+        for _ in range(8):
+            if entry is None:
+                break
+            if rdtype in entry:
+                response.answer.append(dns.rrset.from_text(name, 60, "IN", rdtype, *entry[rdtype]))
+                break
+            if "CNAME" not in entry:
+                break
+            target = entry["CNAME"][0].rstrip(".") + "."
+            response.answer.append(dns.rrset.from_text(name, 60, "IN", "CNAME", target))
+            name = dns.name.from_text(target)
+            entry = self.lookup(target.lower().rstrip("."))
+        
+        self.transport.sendto(response.to_wire(), addr)
+
+async def start_standin(records=None, host="127.0.0.1", port=0, **options):
+    loop = asyncio.get_running_loop()
+    server = StandInDnsServer(records, **options)
+    transport, _ = await loop.create_datagram_endpoint(lambda: server, local_addr=(host, port))
+    return server, transport.get_extra_info("sockname")[1]
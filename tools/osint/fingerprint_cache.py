@@ -0,0 +1,108 @@
+import os
+import sqlite3
+import time
+
+# отпечатки сервисов между запусками: (ip, port, proto) -> баннер и сервис с временем последней полной пробы.
+# записи моложе ttl переиспользуются, устаревшие пробуются заново
+DEFAULT_PATH = "results/fingerprints.db"
+DEFAULT_TTL = 24 * 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fingerprints (
+    ip TEXT NOT NULL,
+    port INTEGER NOT NULL,
+    proto TEXT NOT NULL,
+    seen REAL NOT NULL,
+    service TEXT,
+    product TEXT,
+    version TEXT,
+    info TEXT,
+    probe TEXT,
+    banner TEXT,
+    PRIMARY KEY (ip, port, proto)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS fingerprints_service ON fingerprints (service, seen);
+"""
+
+class FingerprintCache:
+    def __init__(self, path=DEFAULT_PATH, ttl=DEFAULT_TTL):
+        self.path = path
+        self.ttl = ttl
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    def close(self):
+        if self.db:
+            self.db.commit()
+            self.db.close()
+            self.db = None
+    
+    def commit(self):
+        self.db.commit()
+    
+    def is_fresh(self, entry, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        return entry is not None and time.time() - entry["seen"] < ttl
+    
+    def get(self, ip, port, proto="tcp", ttl=None):
+        # только свежая запись; устаревшая считается промахом
+        row = self.db.execute("SELECT * FROM fingerprints WHERE ip = ? AND port = ? AND proto = ?", (ip, port, proto)).fetchone()
+        entry = dict(row) if row else None
+        return entry if self.is_fresh(entry, ttl) else None
+    
+    def fresh(self, ip, proto="tcp", ttl=None):
+        # все свежие записи хоста одним запросом: port -> запись
+        ttl = self.ttl if ttl is None else ttl
+        rows = self.db.execute(
+            "SELECT * FROM fingerprints WHERE ip = ? AND proto = ? AND seen > ?",
+            (ip, proto, time.time() - ttl)
+        )
+        return {row["port"]: dict(row) for row in rows}
+    
+    def put(self, ip, port, proto="tcp", banner=None, service=None, product=None, version=None, info=None, probe=None):
+        self.db.execute(
+            "INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (ip, port, proto, time.time(), service, product, version, info, probe, banner)
+        )
+    
+    def forget(self, ip, port, proto="tcp"):
+        self.db.execute("DELETE FROM fingerprints WHERE ip = ? AND port = ? AND proto = ?", (ip, port, proto))
+    
+    def by_service(self, service, ttl=None):
+        # поиск по индексу сервиса по всем хостам; ttl=None - любые записи, независимо от возраста
+        if ttl is None:
+            rows = self.db.execute("SELECT * FROM fingerprints WHERE service = ? ORDER BY ip, port", (service,))
+        else:
+            rows = self.db.execute(
+                "SELECT * FROM fingerprints WHERE service = ? AND seen > ? ORDER BY ip, port",
+                (service, time.time() - ttl)
+            )
+        return [dict(row) for row in rows]
+    
+    def services(self):
+        rows = self.db.execute("SELECT service, COUNT(*) FROM fingerprints GROUP BY service ORDER BY COUNT(*) DESC")
+        return [(service, count) for service, count in rows]
+    
+    def purge(self, max_age=None):
+        max_age = self.ttl if max_age is None else max_age
+        cursor = self.db.execute("DELETE FROM fingerprints WHERE seen < ?", (time.time() - max_age,))
+        self.db.commit()
+        return cursor.rowcount
+
+def same_fingerprint(found, entry):
+    # уверенное совпадение сравниваем по продукту и версии (в ответах бывают даты и прочий шум), иначе по баннеру
+    if found["confident"]:
+        return (found["service"], found.get("product"), found.get("version")) == (entry["service"], entry["product"], entry["version"])
+    return found["banner"].decode('utf-8', errors='ignore').strip()[:150] == entry["banner"]
@@ -8,6 +8,15 @@ from datetime import datetime
 from bs4 import BeautifulSoup
 import dns.resolver
 import concurrent.futures
+from tools.osint import service_table
+
+# в отчете сервисы называются привычно, а не именами из таблицы nmap
+SERVICE_LABELS = {
+    "microsoft-ds": "smb",
+    "ms-sql-s": "mssql",
+    "ms-wbt-server": "rdp",
+    "mongod": "mongodb"
+}
 
 class AdvancedOSINTCollector:
     def __init__(self, domain):
@@ -300,28 +309,7 @@ class AdvancedOSINTCollector:
     def check_exposed_services(self):
         services = []
         
-        common_ports = {
-            21: "ftp",
-            22: "ssh",
-            23: "telnet",
-            25: "smtp",
-            80: "http",
-            110: "pop3",
-            143: "imap",
-            443: "https",
-            445: "smb",
-            1433: "mssql",
-            1521: "oracle",
-            3306: "mysql",
-            3389: "rdp",
-            5432: "postgresql",
-            5900: "vnc",
-            6379: "redis",
-            8080: "http-proxy",
-            8443: "https-alt",
-            27017: "mongodb",
-            9200: "elasticsearch"
-        }
+        common_ports = [21, 22, 23, 25, 80, 110, 143, 443, 445, 1433, 1521, 3306, 3389, 5432, 5900, 6379, 8080, 8443, 27017, 9200]
         
         try:
             ip = socket.gethostbyname(self.domain)
@@ -336,7 +324,8 @@ class AdvancedOSINTCollector:
                 sock.close()
                 
                 if result == 0:
-                    service_name = common_ports.get(port, f"port_{port}")
+                    service_name = service_table.service_name(port)
+                    service_name = SERVICE_LABELS.get(service_name, service_name)
                     
                     try:
                         sock2 = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -359,7 +348,7 @@ class AdvancedOSINTCollector:
             return None
         
         with concurrent.futures.ThreadPoolExecutor(max_workers=50) as executor:
-            futures = [executor.submit(check_port, port) for port in common_ports.keys()]
+            futures = [executor.submit(check_port, port) for port in common_ports]
             for future in concurrent.futures.as_completed(futures):
                 result = future.result()
                 if result:
@@ -1,95 +1,677 @@
 import asyncio
+import base64
+import errno
+import heapq
+import ipaddress
+import itertools
+import json
+import multiprocessing
+import os
+import queue
+import selectors
 import socket
+import tempfile
+import threading
+import time
+import zlib
+from collections import deque
 from datetime import datetime
+from tools.osint import service_table, port_spec, service_probes, fingerprint_cache
 
-async def check_port(ip, port, timeout=1):
-    try:
-        reader, writer = await asyncio.wait_for(
-            asyncio.open_connection(ip, port),
-            timeout=timeout
-        )
-        writer.close()
-        await writer.wait_closed()
-        
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# ошибки нехватки локальных ресурсов: о состоянии порта они ничего не говорят
+RESOURCE_ERRNOS = {errno.EMFILE, errno.ENFILE, errno.ENOBUFS, errno.ENOMEM, errno.EADDRNOTAVAIL}
+FD_RESERVE = 64
+MAX_AUTO_CONCURRENCY = 8192
+
+_fd_limit = None
+
+def raise_fd_limit():
+    # поднимаем мягкий лимит RLIMIT_NOFILE до жесткого, если система разрешает
+    global _fd_limit
+    if _fd_limit is not None:
+        return _fd_limit
+    if resource is None:
+        _fd_limit = 512
+        return _fd_limit
+    
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    target = hard if hard != resource.RLIM_INFINITY else 65536
+    if soft != resource.RLIM_INFINITY and soft < target:
         try:
-            service = socket.getservbyport(port)
-        except:
-            service = "unknown"
-        
-        return port, "open", service
-    except:
-        return port, "closed", None
+            resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+            soft = target
+        except (ValueError, OSError):
+            pass
+    _fd_limit = soft if soft != resource.RLIM_INFINITY else 65536
+    return _fd_limit
+
+def auto_concurrency(requested=None):
+    budget = max(raise_fd_limit() - FD_RESERVE, 16)
+    if requested is None:
+        return min(budget, MAX_AUTO_CONCURRENCY)
+    return min(requested, budget)
+
+class TokenBucket:
+    # ограничение числа новых соединений в секунду, burst - сколько можно открыть разом
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate / 10))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+    
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def try_acquire(self):
+        self.refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+    
+    def delay(self):
+        self.refill()
+        return max(0, (1 - self.tokens) / self.rate)
+
+def make_limiter(rate):
+    return TokenBucket(rate) if rate else None
+
+def count_status(stats, status):
+    if stats is not None:
+        stats[status] = stats.get(status, 0) + 1
 
-async def grab_banner(ip, port, timeout=2):
+async def read_banner(reader, writer, connect_time, probe=b"\r\n", timeout=1):
+    # сначала ждем приветствие сервиса (ssh, ftp, smtp говорят первыми), время ожидания зависит от rtt соединения
+    greeting_wait = min(max(connect_time * 4, 0.1), timeout)
     try:
-        reader, writer = await asyncio.wait_for(
-            asyncio.open_connection(ip, port),
-            timeout=timeout
-        )
-        
-        await asyncio.sleep(0.5)
-        writer.write(b"\r\n")
+        banner = await asyncio.wait_for(reader.read(1024), timeout=greeting_wait)
+    except asyncio.TimeoutError:
+        banner = b""
+    
+    if not banner:
+        writer.write(probe)
         await writer.drain()
-        
-        banner = await asyncio.wait_for(reader.read(1024), timeout=1)
+        try:
+            banner = await asyncio.wait_for(reader.read(1024), timeout=timeout)
+        except asyncio.TimeoutError:
+            banner = b""
+    
+    banner = banner.decode('utf-8', errors='ignore').strip()
+    return banner or None
+
+class RttEstimator:
+    # сглаженный rtt и его разброс как в tcp (rfc 6298), таймаут = srtt + 4 * rttvar
+    def __init__(self, initial_timeout=1, min_timeout=0.1, max_timeout=3):
+        self.initial_timeout = initial_timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.srtt = None
+        self.rttvar = None
+        self.samples = 0
+    
+    def update(self, sample):
+        if self.srtt is None:
+            self.srtt = sample
+            self.rttvar = sample / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - sample)
+            self.srtt = 0.875 * self.srtt + 0.125 * sample
+        self.samples += 1
+    
+    def timeout(self):
+        if self.srtt is None:
+            return self.initial_timeout
+        return min(max(self.srtt + 4 * self.rttvar, self.min_timeout), self.max_timeout)
+    
+    def retry_timeout(self, timeout):
+        return min(max(timeout * 2, self.timeout() * 2), self.max_timeout)
+
+async def check_port(ip, port, timeout=1, get_banner=False, rtt=None, retries=1):
+    loop = asyncio.get_running_loop()
+    if rtt:
+        timeout = rtt.timeout()
+    
+    for attempt in range(retries + 1):
+        started = loop.time()
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(ip, port),
+                timeout=timeout
+            )
+            break
+        except asyncio.TimeoutError:
+            timeout = rtt.retry_timeout(timeout) if rtt else timeout * 2
+        except ConnectionRefusedError:
+            # rst тоже ответ хоста, по нему меряем rtt (повторные попытки не учитываем, алгоритм карна)
+            if rtt and attempt == 0:
+                rtt.update(loop.time() - started)
+            return port, "closed", None, None
+        except OSError as e:
+            if e.errno in RESOURCE_ERRNOS:
+                return port, "error", None, None
+            return port, "closed", None, None
+    else:
+        return port, "filtered", None, None
+    
+    connect_time = loop.time() - started
+    if rtt and attempt == 0:
+        rtt.update(connect_time)
+    
+    banner = None
+    try:
+        if get_banner:
+            banner = await read_banner(reader, writer, connect_time)
+    except OSError:
+        pass
+    finally:
         writer.close()
-        await writer.wait_closed()
-        
-        return banner.decode('utf-8', errors='ignore').strip()
-    except:
-        return None
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+    
+    return port, "open", service_table.service_name(port), banner
 
-async def scan_ports(ip, ports, max_concurrent=200, get_banners=False):
+async def iter_open_ports(ip, ports, max_concurrent=200, get_banners=False, rtt=None, limiter=None, stats=None, covered=None):
+    # держим в полете не больше max_concurrent задач, остальные порты берем из итератора по мере освобождения окна
+    if rtt is None:
+        rtt = RttEstimator()
+    ports = iter(ports)
+    pending = set()
+    exhausted = False
+    
+    def fill():
+        # возвращает True, если окно не заполнено из-за ограничения скорости
+        nonlocal exhausted
+        while not exhausted and len(pending) < max_concurrent:
+            if limiter and not limiter.try_acquire():
+                return True
+            port = next(ports, None)
+            if port is None:
+                exhausted = True
+                break
+            pending.add(asyncio.create_task(check_port(ip, port, get_banner=get_banners, rtt=rtt)))
+        return False
+    
+    try:
+        throttled = fill()
+        while pending or throttled:
+            wait = limiter.delay() if throttled else None
+            if not pending:
+                await asyncio.sleep(wait)
+                throttled = fill()
+                continue
+            
+            done, _ = await asyncio.wait(pending, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+            pending.difference_update(done)
+            throttled = fill()
+            
+            for task in done:
+                port, status, service, banner = task.result()
+                count_status(stats, status)
+                if status != "open":
+                    if covered is not None and status != "error":
+                        covered.add(port)
+                    continue
+                
+                yield {
+                    "port": port,
+                    "service": service,
+                    "banner": banner,
+                    "status": status
+                }
+                # открытый порт считается пройденным только после того, как его принял потребитель:
+                # иначе чекпоинт может сохранить порт пройденным, но не открытым, и при продолжении он потеряется
+                if covered is not None:
+                    covered.add(port)
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+async def scan_ports(ip, ports, max_concurrent=200, get_banners=False, on_open=None, rtt=None, limiter=None, stats=None, covered=None):
     open_ports = []
     
-    semaphore = asyncio.Semaphore(max_concurrent)
+    async for port_info in iter_open_ports(ip, ports, max_concurrent, get_banners, rtt, limiter, stats, covered):
+        open_ports.append(port_info)
+        if on_open:
+            on_open(port_info)
+    
+    open_ports.sort(key=lambda p: p["port"])
+    return open_ports
+
+def iter_open_ports_selector(ip, ports, max_concurrent=1024, get_banners=False, rtt=None, retries=1, probe=b"\r\n", limiter=None, stats=None, covered=None, stop=None):
+    # движок без asyncio: неблокирующие сокеты, connect_ex и epoll/kqueue через selectors, итог connect берем из SO_ERROR
+    if rtt is None:
+        rtt = RttEstimator()
+    selector = selectors.DefaultSelector()
+    family = socket.AF_INET6 if ":" in ip else socket.AF_INET
+    ports = iter(ports)
+    retry = deque()
+    deadlines = []
+    counter = itertools.count()
+    in_flight = 0
+    exhausted = False
+    
+    def set_deadline(state, timeout):
+        state["deadline"] = time.monotonic() + timeout
+        heapq.heappush(deadlines, (state["deadline"], next(counter), state))
+    
+    def start(port, attempt, timeout):
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        err = sock.connect_ex((ip, port))
+        if err not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+            sock.close()
+            return "error" if err in RESOURCE_ERRNOS else "closed"
+        state = {"sock": sock, "port": port, "attempt": attempt, "timeout": timeout, "stage": "connect", "started": time.monotonic()}
+        selector.register(sock, selectors.EVENT_WRITE, state)
+        set_deadline(state, timeout)
+        return None
+    
+    def mark(port, status):
+        count_status(stats, status)
+        if covered is not None and status not in ("error", "open"):
+            covered.add(port)
+    
+    def close(state):
+        selector.unregister(state["sock"])
+        state["sock"].close()
+        state["stage"] = "done"
     
-    async def scan_with_semaphore(port):
-        async with semaphore:
-            return await check_port(ip, port)
+    def open_port(state, banner=None):
+        close(state)
+        mark(state["port"], "open")
+        banner = banner.decode('utf-8', errors='ignore').strip() if banner else None
+        return {
+            "port": state["port"],
+            "service": service_table.service_name(state["port"]),
+            "banner": banner or None,
+            "status": "open"
+        }
     
-    tasks = [scan_with_semaphore(port) for port in ports]
-    results = await asyncio.gather(*tasks)
+    try:
+        while not (stop and stop.is_set()):
+            throttled = False
+            while in_flight < max_concurrent and (retry or not exhausted):
+                if limiter and not limiter.try_acquire():
+                    throttled = True
+                    break
+                if retry:
+                    port, attempt, timeout = retry.popleft()
+                else:
+                    port = next(ports, None)
+                    if port is None:
+                        exhausted = True
+                        break
+                    attempt, timeout = 0, rtt.timeout()
+                try:
+                    status = start(port, attempt, timeout)
+                except OSError as e:
+                    if e.errno not in RESOURCE_ERRNOS:
+                        raise
+                    # кончились дескрипторы: порт вернется в очередь, когда освободятся сокеты
+                    if in_flight:
+                        retry.appendleft((port, attempt, timeout))
+                        break
+                    status = "error"
+                if status:
+                    mark(port, status)
+                else:
+                    in_flight += 1
+            
+            if not in_flight:
+                if not throttled:
+                    break
+                time.sleep(limiter.delay())
+                continue
+            
+            found = []
+            wait = max(deadlines[0][0] - time.monotonic(), 0) if deadlines else None
+            if throttled:
+                wait = min(wait, limiter.delay()) if wait is not None else limiter.delay()
+            for key, _ in selector.select(wait):
+                state = key.data
+                sock = state["sock"]
+                if state["stage"] == "connect":
+                    err = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                    connect_time = time.monotonic() - state["started"]
+                    if err in (0, errno.ECONNREFUSED) and state["attempt"] == 0:
+                        rtt.update(connect_time)
+                    if err != 0:
+                        close(state)
+                        mark(state["port"], "error" if err in RESOURCE_ERRNOS else "closed")
+                        in_flight -= 1
+                    elif get_banners:
+                        state["stage"] = "greeting"
+                        selector.modify(sock, selectors.EVENT_READ, state)
+                        set_deadline(state, min(max(connect_time * 4, 0.1), 1))
+                    else:
+                        found.append(open_port(state))
+                        in_flight -= 1
+                else:
+                    try:
+                        data = sock.recv(1024)
+                    except OSError:
+                        data = b""
+                    found.append(open_port(state, data))
+                    in_flight -= 1
+            
+            now = time.monotonic()
+            while deadlines and deadlines[0][0] <= now:
+                deadline, _, state = heapq.heappop(deadlines)
+                if state["stage"] == "done" or state["deadline"] != deadline:
+                    continue
+                if state["stage"] == "connect":
+                    close(state)
+                    in_flight -= 1
+                    if state["attempt"] < retries:
+                        retry.append((state["port"], state["attempt"] + 1, rtt.retry_timeout(state["timeout"])))
+                    else:
+                        mark(state["port"], "filtered")
+                elif state["stage"] == "greeting":
+                    state["stage"] = "probe"
+                    try:
+                        state["sock"].send(probe)
+                    except OSError:
+                        pass
+                    set_deadline(state, 1)
+                else:
+                    found.append(open_port(state))
+                    in_flight -= 1
+            
+            for port_info in found:
+                yield port_info
+                # как в iter_open_ports: пройденным открытый порт становится после передачи потребителю
+                if covered is not None:
+                    covered.add(port_info["port"])
+    finally:
+        for key in list(selector.get_map().values()):
+            key.fileobj.close()
+        selector.close()
+
+def scan_ports_selector(ip, ports, max_concurrent=1024, get_banners=False, on_open=None, rtt=None, limiter=None, stats=None, covered=None, stop=None):
+    open_ports = []
     
-    for port, status, service in results:
-        if status == "open":
-            banner = None
-            if get_banners:
-                banner = await grab_banner(ip, port)
-            open_ports.append({
-                "port": port,
-                "service": service,
-                "banner": banner,
-                "status": status
-            })
+    for port_info in iter_open_ports_selector(ip, ports, max_concurrent, get_banners, rtt, limiter=limiter, stats=stats, covered=covered, stop=stop):
+        open_ports.append(port_info)
+        if on_open:
+            on_open(port_info)
     
+    open_ports.sort(key=lambda p: p["port"])
     return open_ports
 
 def parse_port_range(port_range):
-    ports = []
-    if "-" in port_range:
-        start, end = map(int, port_range.split("-"))
-        ports = list(range(start, end + 1))
-    elif "," in port_range:
-        ports = [int(p) for p in port_range.split(",")]
-    else:
-        ports = [int(port_range)]
-    return ports
+    return port_spec.parse_ports(port_range)
 
-async def port_scan(target, port_range="1-1024", max_concurrent=200, get_banners=False):
+class ResolvedTarget:
+    # все A и AAAA записи цели, разрешенные один раз на скан
+    def __init__(self, target, addresses):
+        self.target = target
+        self.addresses = addresses
+    
+    @property
+    def ip(self):
+        return self.addresses[0]
+    
+    def scan_addresses(self, all_addresses=False):
+        return list(self.addresses) if all_addresses else self.addresses[:1]
+
+async def resolve_addresses(target, family=socket.AF_UNSPEC):
+    # адрес ipv4 или ipv6 берется как есть, имя разрешается во все адреса; None - не разрешилось
     try:
-        ip = socket.gethostbyname(target)
-        resolved_from = target if target != ip else None
+        return ResolvedTarget(target, [str(ipaddress.ip_address(target))])
+    except ValueError:
+        pass
+    
+    loop = asyncio.get_running_loop()
+    try:
+        infos = await loop.getaddrinfo(target, None, family=family, type=socket.SOCK_STREAM)
     except socket.gaierror:
+        return None
+    
+    addresses = []
+    for info in infos:
+        address = info[4][0]
+        if address not in addresses:
+            addresses.append(address)
+    return ResolvedTarget(target, addresses) if addresses else None
+
+def parse_target_entry(entry):
+    if "/" in entry:
+        try:
+            network = ipaddress.ip_network(entry, strict=False)
+        except ValueError:
+            return iter([entry])
+        return (str(ip) for ip in network.hosts())
+    
+    if "-" in entry:
+        start, end = entry.split("-", 1)
+        try:
+            start_ip = ipaddress.IPv4Address(start)
+            if "." not in end:
+                end = start.rsplit(".", 1)[0] + "." + end
+            end_ip = ipaddress.IPv4Address(end)
+        except ValueError:
+            return iter([entry])
+        return (str(ipaddress.IPv4Address(i)) for i in range(int(start_ip), int(end_ip) + 1))
+    
+    return iter([entry])
+
+def iter_targets(targets):
+    # цели разворачиваются лениво: /16 не превращается в список из 65к адресов
+    if isinstance(targets, str):
+        targets = targets.split(",")
+    
+    for entry in targets:
+        entry = entry.strip()
+        if not entry or entry.startswith("#"):
+            continue
+        
+        # файл читается только с префиксом @: цель, совпавшая с именем файла в текущем каталоге, остается целью
+        if entry.startswith("@"):
+            with open(entry[1:], 'r', encoding='utf-8') as f:
+                for line in f:
+                    yield from iter_targets([line])
+            continue
+        
+        yield from parse_target_entry(entry)
+
+def is_multi_target(targets):
+    if not isinstance(targets, str):
+        return True
+    targets = targets.strip()
+    if any(c in targets for c in ",/@"):
+        return True
+    return next(parse_target_entry(targets), targets) != targets
+
+CHECKPOINT_INTERVAL = 5
+
+def save_checkpoint(path, target, ip, port_range, covered_bits, open_ports, finished=False):
+    # карта пройденных портов (8 кб) сжимается zlib, файл пишется атомарно через os.replace
+    state = {
+        "version": 1,
+        "target": target,
+        "resolved_ip": ip,
+        "port_range": port_range,
+        "covered": base64.b64encode(zlib.compress(covered_bits)).decode(),
+        "open_ports": open_ports,
+        "finished": finished,
+        "updated": datetime.now().isoformat()
+    }
+    
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # у каждой записи свой временный файл: две записи подряд не пишут в один и тот же .tmp
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory or ".")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def load_checkpoint(path, target, port_range):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        covered = port_spec.PortSet.from_bytes(zlib.decompress(base64.b64decode(state["covered"])))
+    except (OSError, ValueError, KeyError, zlib.error):
+        return None
+    
+    if state.get("target") != target or state.get("port_range") != port_range:
+        return None
+    state["covered"] = covered
+    return state
+
+class CheckpointWriter:
+    # периодические записи и итоговая идут по очереди; после итоговой запоздавшая периодическая
+    # (отмененная задача, но уже запущенный поток) старый снимок поверх не кладет
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.closed = False
+    
+    def save(self, state):
+        with self.lock:
+            if not self.closed:
+                save_checkpoint(self.path, *state)
+    
+    def close(self, state):
+        with self.lock:
+            self.closed = True
+            save_checkpoint(self.path, *state)
+
+async def checkpoint_loop(writer, snapshot, interval=CHECKPOINT_INTERVAL):
+    # запись идет в пуле потоков, сканирование ее не ждет
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(interval)
+        await loop.run_in_executor(None, writer.save, snapshot())
+
+async def verify_cached(cache, ip, open_ports, known, max_concurrent, timeout=1, deadline=3):
+    # свежая запись проверяется той же пробой, что дала ответ при полном определении сервиса.
+    # совпало - берем сервис из кэша; изменился или не ответил - запись удаляется, полную пробу сделает определитель сервисов
+    limit = asyncio.Semaphore(max_concurrent)
+    
+    async def verify(port_info):
+        entry = known[port_info["port"]]
+        async with limit:
+            found = await service_probes.reprobe(ip, port_info["port"], entry["probe"], timeout, deadline)
+        if found is not None and fingerprint_cache.same_fingerprint(found, entry):
+            port_info.update(service=entry["service"], banner=entry["banner"], cached=True)
+            return
+        cache.forget(ip, port_info["port"])
+        port_info["changed"] = True
+        if found is not None and found["banner"]:
+            port_info["banner"] = found["banner"].decode('utf-8', errors='ignore').strip()[:150]
+    
+    await asyncio.gather(*(verify(p) for p in open_ports if p["port"] in known))
+
+def update_cache(cache, ip, open_ports, known):
+    # сканер портов в кэш не пишет: угадывание по номеру порта - не отпечаток сервиса.
+    # удаляются только записи портов, закрывшихся с прошлого раза
+    open_set = {port_info["port"] for port_info in open_ports}
+    for port in known:
+        if port not in open_set:
+            cache.forget(ip, port)
+    cache.commit()
+
+async def resolve_ip(target):
+    # одиночная цель сканируется по первому адресу, как и в мультискане: ipv6 проходит наравне с ipv4
+    resolved = await resolve_addresses(target)
+    return resolved.ip if resolved else None
+
+async def port_scan(target, port_range="1-1024", max_concurrent=None, get_banners=False, on_open=None, engine="asyncio", rate=None, checkpoint=None, resume=False, cache=None):
+    ip = await resolve_ip(target)
+    if ip is None:
         return {
             "error": f"не удалось разрешить домен: {target}",
             "target": target,
             "resolved_ip": None
         }
+    resolved_from = target if target != ip else None
     
     start_time = datetime.now()
     ports = parse_port_range(port_range)
-    open_ports = await scan_ports(ip, ports, max_concurrent, get_banners)
+    max_concurrent = auto_concurrency(max_concurrent)
+    rtt = RttEstimator()
+    limiter = make_limiter(rate)
+    stats = {}
+    
+    covered = port_spec.PortSet()
+    found = []
+    state = load_checkpoint(checkpoint, target, port_range) if checkpoint and resume else None
+    if state:
+        covered = state["covered"]
+        # открытый порт, который не успел попасть в пройденные, будет просканирован заново - без дубля в результате
+        found = [p for p in state["open_ports"] if p["port"] in covered]
+    remaining = ports.difference(covered)
+    
+    # порты со свежим отпечатком в кэше сканируются без чтения баннера, открытые потом сверяются одной пробой
+    known = {port: entry for port, entry in cache.fresh(ip).items() if port in ports} if cache and get_banners else {}
+    known_ports = port_spec.PortSet(known)
+    passes = [(remaining.difference(known_ports), get_banners), (remaining.intersection(known_ports), False)]
+    
+    def record_open(port_info):
+        found.append(port_info)
+        if on_open:
+            on_open(port_info)
+    
+    def snapshot(finished=False):
+        # карта пройденных снимается раньше списка открытых: порт из карты уже есть в found
+        covered_bits = covered.to_bytes()
+        return target, ip, port_range, covered_bits, list(found), finished
+    
+    writer = CheckpointWriter(checkpoint) if checkpoint else None
+    saver = asyncio.create_task(checkpoint_loop(writer, snapshot)) if writer else None
+    stop = threading.Event()
+    scanning = threading.Lock()
+    
+    def scan_selector(pass_ports, pass_banners):
+        with scanning:
+            if stop.is_set():
+                return []
+            return scan_ports_selector(ip, pass_ports, max_concurrent, pass_banners, record_open, rtt, limiter, stats, covered, stop)
+    
+    finished = False
+    try:
+        for pass_ports, pass_banners in passes:
+            if not pass_ports:
+                continue
+            if engine == "selectors":
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(None, scan_selector, pass_ports, pass_banners)
+            else:
+                await scan_ports(ip, pass_ports, max_concurrent, pass_banners, record_open, rtt, limiter, stats, covered)
+        finished = True
+    finally:
+        stop.set()
+        if saver:
+            saver.cancel()
+        # при отмене поток движка selectors еще дорабатывает текущую пачку: итоговый снимок делается после его выхода
+        with scanning:
+            pass
+        if writer:
+            writer.close(snapshot(finished))
+    
+    open_ports = sorted(found, key=lambda p: p["port"])
+    if cache and get_banners:
+        await verify_cached(cache, ip, open_ports, known, max_concurrent)
+        update_cache(cache, ip, open_ports, known)
     end_time = datetime.now()
     scan_time = (end_time - start_time).total_seconds()
     
@@ -101,8 +683,440 @@ async def port_scan(target, port_range="1-1024", max_concurrent=200, get_banners
         "total_ports": len(ports),
         "open_ports_count": len(open_ports),
         "open_ports": open_ports,
+        "filtered_count": stats.get("filtered", 0),
+        "resource_errors": stats.get("error", 0),
+        "max_concurrent": max_concurrent,
+        "resumed_ports": len(ports) - len(remaining),
+        "cached_banners": sum(1 for p in open_ports if p.get("cached")),
+        "changed_services": sum(1 for p in open_ports if p.get("changed")),
+        "rtt": rtt.srtt,
         "timestamp": datetime.now().isoformat()
     }
 
-def run_scanner(target, port_range="1-1024", max_concurrent=200, get_banners=False):
-    return asyncio.run(port_scan(target, port_range, max_concurrent, get_banners))
\ No newline at end of file
+async def stream_port_scan(target, port_range="1-1024", max_concurrent=None, get_banners=False, rate=None):
+    ip = await resolve_ip(target)
+    if ip is None:
+        return
+    
+    async for port_info in iter_open_ports(ip, parse_port_range(port_range), auto_concurrency(max_concurrent), get_banners, limiter=make_limiter(rate)):
+        yield port_info
+
+def new_host_result(target, ip, index=None):
+    # index - позиция цели в списке: одна и та же цель может встретиться в нем дважды
+    return {
+        "index": index,
+        "target": target,
+        "resolved_ip": ip,
+        "resolved_from": target if ip and target != ip else None,
+        "scan_time": 0,
+        "total_ports": 0,
+        "open_ports_count": 0,
+        "open_ports": [],
+        "filtered_count": 0,
+        "resource_errors": 0,
+        "rtt": None,
+        "timestamp": None
+    }
+
+async def iter_multi_scan(targets, ports, max_concurrent=None, per_host=64, get_banners=False, rate=None):
+    # общий бюджет max_concurrent делится между хостами по кругу, на один хост не больше per_host задач
+    loop = asyncio.get_running_loop()
+    max_concurrent = auto_concurrency(max_concurrent)
+    limiter = make_limiter(rate)
+    target_iter = enumerate(iter_targets(targets))
+    max_hosts = max(1, -(-max_concurrent // per_host)) + 1
+    active = deque()
+    pending = {}
+    
+    async def admit_hosts():
+        unresolved = []
+        while len(active) < max_hosts:
+            entry = next(target_iter, None)
+            if entry is None:
+                break
+            index, target = entry
+            # в списке целей бывают и ipv6-адреса и сети, поэтому разрешаем в оба семейства
+            resolved = await resolve_addresses(target)
+            ip = resolved.ip if resolved else None
+            host = new_host_result(target, ip, index)
+            if ip is None:
+                host["error"] = f"не удалось разрешить домен: {target}"
+                unresolved.append(host)
+                continue
+            host["ports"] = iter(ports)
+            host["exhausted"] = False
+            host["in_flight"] = 0
+            host["estimator"] = RttEstimator()
+            host["started"] = loop.time()
+            active.append(host)
+        return unresolved
+    
+    def fill():
+        idle_rounds = 0
+        while len(pending) < max_concurrent and active and idle_rounds < len(active):
+            host = active[0]
+            active.rotate(-1)
+            if host["exhausted"] or host["in_flight"] >= per_host:
+                idle_rounds += 1
+                continue
+            if limiter and not limiter.try_acquire():
+                return True
+            port = next(host["ports"], None)
+            if port is None:
+                host["exhausted"] = True
+                idle_rounds += 1
+                continue
+            idle_rounds = 0
+            host["in_flight"] += 1
+            host["total_ports"] += 1
+            task = asyncio.create_task(check_port(host["resolved_ip"], port, get_banner=get_banners, rtt=host["estimator"]))
+            pending[task] = host
+        return False
+    
+    def finish(host):
+        active.remove(host)
+        host["scan_time"] = loop.time() - host.pop("started")
+        host["timestamp"] = datetime.now().isoformat()
+        host["open_ports"].sort(key=lambda p: p["port"])
+        host["open_ports_count"] = len(host["open_ports"])
+        host["rtt"] = host.pop("estimator").srtt
+        del host["ports"], host["exhausted"], host["in_flight"]
+        return host
+    
+    try:
+        while True:
+            for host in await admit_hosts():
+                yield "done", host, None
+            throttled = fill()
+            
+            finished = [h for h in active if h["exhausted"] and h["in_flight"] == 0]
+            for host in finished:
+                yield "done", finish(host), None
+            if finished:
+                continue
+            
+            wait = limiter.delay() if throttled else None
+            if not pending:
+                if not throttled:
+                    break
+                await asyncio.sleep(wait)
+                continue
+            
+            done, _ = await asyncio.wait(pending, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                host = pending.pop(task)
+                host["in_flight"] -= 1
+                port, status, service, banner = task.result()
+                if status == "filtered":
+                    host["filtered_count"] += 1
+                elif status == "error":
+                    host["resource_errors"] += 1
+                elif status == "open":
+                    port_info = {
+                        "port": port,
+                        "service": service,
+                        "banner": banner,
+                        "status": status
+                    }
+                    host["open_ports"].append(port_info)
+                    yield "open", host, port_info
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+async def multi_port_scan(targets, port_range="1-1024", max_concurrent=None, per_host=64, get_banners=False, on_open=None, on_host_done=None, rate=None):
+    start_time = datetime.now()
+    ports = parse_port_range(port_range)
+    hosts = []
+    
+    async for event, host, port_info in iter_multi_scan(targets, ports, max_concurrent, per_host, get_banners, rate):
+        if event == "open":
+            if on_open:
+                on_open(host, port_info)
+        else:
+            hosts.append(host)
+            if on_host_done:
+                on_host_done(host)
+    
+    end_time = datetime.now()
+    return {
+        "targets": hosts,
+        "scan_time": (end_time - start_time).total_seconds(),
+        "total_hosts": len(hosts),
+        "hosts_with_open_ports": sum(1 for h in hosts if h["open_ports"]),
+        "open_ports_count": sum(h["open_ports_count"] for h in hosts),
+        "resource_errors": sum(h["resource_errors"] for h in hosts),
+        "timestamp": datetime.now().isoformat()
+    }
+
+def shard_worker(worker_id, ip, port_bits, order, max_concurrent, get_banners, engine, rate, results):
+    # отдельный процесс со своим циклом событий; открытые порты сразу уходят родителю через очередь
+    ports = port_spec.PortSet.from_bytes(port_bits, order)
+    stats = {}
+    started = time.monotonic()
+    
+    def report(port_info):
+        results.put(("open", worker_id, port_info))
+    
+    try:
+        if engine == "selectors":
+            scan_ports_selector(ip, ports, max_concurrent, get_banners, report, RttEstimator(), make_limiter(rate), stats)
+        else:
+            asyncio.run(scan_ports(ip, ports, max_concurrent, get_banners, report, RttEstimator(), make_limiter(rate), stats))
+    except KeyboardInterrupt:
+        pass
+    
+    results.put(("done", worker_id, {
+        "worker": worker_id,
+        "ports": len(ports),
+        "scan_time": time.monotonic() - started,
+        "open_ports_count": stats.get("open", 0),
+        "filtered_count": stats.get("filtered", 0),
+        "resource_errors": stats.get("error", 0)
+    }))
+
+def run_shard_processes(worker, worker_args, workers, on_event):
+    # общий для шардированных сканов цикл: процесс на шард, разбор общей очереди событий, упавший процесс
+    # отмечается ошибкой вместо вечного ожидания. worker_args(worker_id) - аргументы процесса между id и очередью,
+    # on_event(event, worker_id, data) получает все события, кроме итогового "done"; возвращается статистика процессов
+    results = multiprocessing.Queue()
+    processes = []
+    for worker_id in range(workers):
+        process = multiprocessing.Process(target=worker, args=(worker_id, *worker_args(worker_id), results), daemon=True)
+        process.start()
+        processes.append(process)
+    
+    worker_stats = {}
+    try:
+        while len(worker_stats) < workers:
+            try:
+                event, worker_id, data = results.get(timeout=0.5)
+            except queue.Empty:
+                dead = [i for i, proc in enumerate(processes) if proc.exitcode is not None and i not in worker_stats]
+                if dead and results.empty():
+                    for worker_id in dead:
+                        worker_stats[worker_id] = {"worker": worker_id, "error": f"процесс завершился с кодом {processes[worker_id].exitcode}"}
+                continue
+            
+            if event == "done":
+                data["ports_per_second"] = data["ports"] / data["scan_time"] if data["scan_time"] else 0
+                worker_stats[worker_id] = data
+            else:
+                on_event(event, worker_id, data)
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+    
+    return [worker_stats[i] for i in sorted(worker_stats)]
+
+def parallel_port_scan(target, port_range="1-1024", workers=None, max_concurrent=None, get_banners=False, on_open=None, engine="asyncio", rate=None):
+    ip = asyncio.run(resolve_ip(target))
+    if ip is None:
+        return {
+            "error": f"не удалось разрешить домен: {target}",
+            "target": target,
+            "resolved_ip": None
+        }
+    
+    workers = workers or os.cpu_count() or 1
+    start_time = datetime.now()
+    ports = parse_port_range(port_range)
+    # бюджет соединений и скорость делятся между процессами, чтобы цель видела ту же нагрузку, что и без шардирования
+    per_worker = max(auto_concurrency(max_concurrent) // workers, 16)
+    per_worker_rate = rate / workers if rate else None
+    
+    def worker_args(worker_id):
+        shard = ports.shard(worker_id, workers)
+        return ip, shard.to_bytes(), shard.order, per_worker, get_banners, engine, per_worker_rate
+    
+    open_ports = []
+    
+    def on_event(event, worker_id, port_info):
+        open_ports.append(port_info)
+        if on_open:
+            on_open(port_info)
+    
+    worker_stats = run_shard_processes(shard_worker, worker_args, workers, on_event)
+    open_ports.sort(key=lambda p: p["port"])
+    end_time = datetime.now()
+    
+    return {
+        "target": target,
+        "resolved_ip": ip,
+        "resolved_from": target if target != ip else None,
+        "scan_time": (end_time - start_time).total_seconds(),
+        "total_ports": len(ports),
+        "open_ports_count": len(open_ports),
+        "open_ports": open_ports,
+        "filtered_count": sum(w.get("filtered_count", 0) for w in worker_stats),
+        "resource_errors": sum(w.get("resource_errors", 0) for w in worker_stats),
+        "max_concurrent": per_worker * workers,
+        "workers": worker_stats,
+        "rtt": None,
+        "timestamp": datetime.now().isoformat()
+    }
+
+def multi_shard_worker(worker_id, targets, port_bits, order, max_concurrent, per_host, get_banners, rate, results):
+    # каждый процесс сканирует все цели, но только свою долю портов: пространство цель x порт делится поровну
+    # при любом числе целей. части одного хоста от разных процессов родитель собирает сам
+    ports = port_spec.PortSet.from_bytes(port_bits, order)
+    started = time.monotonic()
+    counters = {"ports": 0, "hosts": 0}
+    
+    async def run():
+        async for event, host, port_info in iter_multi_scan(targets, ports, max_concurrent, per_host, get_banners, rate):
+            if event == "open":
+                results.put(("open", worker_id, (host["target"], host["resolved_ip"], port_info)))
+            else:
+                counters["ports"] += host["total_ports"]
+                counters["hosts"] += 1
+                results.put(("host", worker_id, host))
+    
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    
+    results.put(("done", worker_id, {
+        "worker": worker_id,
+        "hosts": counters["hosts"],
+        "ports": counters["ports"],
+        "scan_time": time.monotonic() - started
+    }))
+
+def merge_host_part(merged, part):
+    if merged is None:
+        return part
+    merged["open_ports"].extend(part["open_ports"])
+    for key in ("total_ports", "filtered_count", "resource_errors"):
+        merged[key] += part[key]
+    merged["scan_time"] = max(merged["scan_time"], part["scan_time"])
+    merged["rtt"] = merged["rtt"] if merged["rtt"] is not None else part["rtt"]
+    merged["timestamp"] = part["timestamp"]
+    return merged
+
+def parallel_multi_scan(targets, port_range="1-1024", workers=None, max_concurrent=None, per_host=64, get_banners=False, on_open=None, on_host_done=None, rate=None):
+    workers = workers or os.cpu_count() or 1
+    start_time = datetime.now()
+    ports = parse_port_range(port_range)
+    # генератор в другой процесс не передать: строка или @файл разбираются в каждом процессе, остальное - списком
+    targets = targets if isinstance(targets, str) else list(targets)
+    per_worker = max(auto_concurrency(max_concurrent) // workers, 16)
+    per_worker_rate = rate / workers if rate else None
+    
+    def worker_args(worker_id):
+        return targets, ports.shard(worker_id, workers).to_bytes(), ports.order, per_worker, per_host, get_banners, per_worker_rate
+    
+    # хост готов, когда его часть прислали все процессы. части сводятся по позиции цели в списке, а не по имени:
+    # цель, указанная дважды, дает два отдельных результата
+    partial = {}
+    parts = {}
+    hosts = []
+    
+    def host_done(host):
+        host["open_ports"].sort(key=lambda p: p["port"])
+        host["open_ports_count"] = len(host["open_ports"])
+        hosts.append(host)
+        if on_host_done:
+            on_host_done(host)
+    
+    def on_event(event, worker_id, data):
+        if event == "open":
+            target, ip, port_info = data
+            if on_open:
+                on_open({"target": target, "resolved_ip": ip}, port_info)
+            return
+        key = data["index"]
+        partial[key] = merge_host_part(partial.get(key), data)
+        parts[key] = parts.get(key, 0) + 1
+        if parts[key] == workers:
+            host_done(partial.pop(key))
+            del parts[key]
+    
+    worker_stats = run_shard_processes(multi_shard_worker, worker_args, workers, on_event)
+    
+    # хосты, часть которых потерялась вместе с упавшим процессом, отдаются с тем, что успели собрать
+    for host in partial.values():
+        host["error"] = host.get("error") or "часть портов не просканирована: процесс-обработчик завершился"
+        host_done(host)
+    
+    end_time = datetime.now()
+    return {
+        "targets": hosts,
+        "scan_time": (end_time - start_time).total_seconds(),
+        "total_hosts": len(hosts),
+        "hosts_with_open_ports": sum(1 for h in hosts if h["open_ports"]),
+        "open_ports_count": sum(h["open_ports_count"] for h in hosts),
+        "resource_errors": sum(h["resource_errors"] for h in hosts),
+        "workers": worker_stats,
+        "timestamp": datetime.now().isoformat()
+    }
+
+def run_scanner(target, port_range="1-1024", max_concurrent=None, get_banners=False, on_open=None, engine="asyncio", rate=None, checkpoint=None, resume=False, workers=None, cache=None):
+    # шардированный режим не ведет чекпоинт и не работает с кэшем отпечатков: молча терять их нельзя
+    if workers and workers > 1:
+        if checkpoint or resume or cache:
+            raise ValueError("checkpoint, resume и cache не поддерживаются вместе с workers > 1")
+        return parallel_port_scan(target, port_range, workers, max_concurrent, get_banners, on_open, engine, rate)
+    return asyncio.run(port_scan(target, port_range, max_concurrent, get_banners, on_open, engine, rate, checkpoint, resume, cache))
+
+def iter_scanner(target, port_range="1-1024", max_concurrent=None, get_banners=False, rate=None):
+    loop = asyncio.new_event_loop()
+    stream = stream_port_scan(target, port_range, max_concurrent, get_banners, rate)
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(stream.__anext__())
+            except StopAsyncIteration:
+                break
+    finally:
+        loop.run_until_complete(stream.aclose())
+        loop.close()
+
+def run_multi_scanner(targets, port_range="1-1024", max_concurrent=None, per_host=64, get_banners=False, on_open=None, on_host_done=None, rate=None, workers=None):
+    if workers and workers > 1:
+        return parallel_multi_scan(targets, port_range, workers, max_concurrent, per_host, get_banners, on_open, on_host_done, rate)
+    return asyncio.run(multi_port_scan(targets, port_range, max_concurrent, per_host, get_banners, on_open, on_host_done, rate))
+
+def benchmark_engines(port_range="1-20000", max_concurrent=512, engines=("asyncio", "selectors")):
+    # закрытые порты на loopback отвечают rst сразу, так что замер показывает накладные расходы самого движка
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(128)
+    open_port = listener.getsockname()[1]
+    stop = threading.Event()
+    
+    def accept_loop():
+        listener.settimeout(0.2)
+        while not stop.is_set():
+            try:
+                conn, _ = listener.accept()
+                conn.close()
+            except OSError:
+                pass
+    
+    acceptor = threading.Thread(target=accept_loop, daemon=True)
+    acceptor.start()
+    
+    results = {}
+    try:
+        spec = f"{port_range},{open_port}"
+        for engine in engines:
+            result = run_scanner("127.0.0.1", spec, max_concurrent, engine=engine)
+            results[engine] = {
+                "ports": result["total_ports"],
+                "scan_time": result["scan_time"],
+                "ports_per_second": result["total_ports"] / result["scan_time"] if result["scan_time"] else 0,
+                "open_ports_count": result["open_ports_count"]
+            }
+            print(f"{engine}: {result['total_ports']} портов за {result['scan_time']:.2f} сек ({results[engine]['ports_per_second']:.0f} порт/сек)")
+    finally:
+        stop.set()
+        acceptor.join()
+        listener.close()
+    
+    return results
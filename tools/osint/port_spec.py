@@ -0,0 +1,172 @@
+from tools.osint import service_table
+
+NAMED_SETS = {
+    "web": [80, 81, 443, 591, 2082, 2083, 3000, 4443, 5000, 8000, 8008, 8080, 8081, 8088, 8443, 8888, 9000, 9443],
+    "db": [1433, 1521, 3306, 5432, 5984, 6379, 7474, 7687, 9042, 9200, 9300, 11211, 27017, 27018, 28017],
+    "mail": [25, 110, 143, 465, 587, 993, 995],
+    "remote": [22, 23, 3389, 5800, 5900, 5985, 5986],
+    "popular": [21, 22, 23, 25, 53, 80, 110, 111, 135, 139, 143, 443, 445, 993, 995,
+                1723, 3306, 3389, 5900, 8080, 8443, 8888, 9000, 9001, 27017, 27018,
+                5432, 6379, 9200, 11211, 2049, 2375, 2376, 3000, 5000, 5672,
+                5984, 7474, 7687, 8000, 8008, 8081, 8090, 8181, 8200, 8300,
+                8500, 9300, 28017, 50000],
+}
+
+class PortSet:
+    # битовая карта на 65536 портов (8 кб): дубликатов нет, проверка вхождения за O(1).
+    # order - порты, которые обходятся первыми в заданном порядке (topN по частоте), остальные - по возрастанию
+    def __init__(self, ports=None, order=None):
+        self.bits = bytearray(8192)
+        self.order = list(order) if order else []
+        if ports is not None:
+            for port in ports:
+                self.add(port)
+    
+    def add(self, port):
+        self.bits[port >> 3] |= 1 << (port & 7)
+    
+    def discard(self, port):
+        self.bits[port >> 3] &= ~(1 << (port & 7)) & 0xFF
+    
+    def add_range(self, start, end):
+        for port in range(start, end + 1):
+            self.add(port)
+    
+    def discard_range(self, start, end):
+        for port in range(start, end + 1):
+            self.discard(port)
+    
+    def __contains__(self, port):
+        return 0 <= port <= 65535 and bool(self.bits[port >> 3] >> (port & 7) & 1)
+    
+    def __len__(self):
+        return int.from_bytes(self.bits, 'little').bit_count()
+    
+    def __bool__(self):
+        return any(self.bits)
+    
+    def __iter__(self):
+        if not self.order:
+            yield from self.ascending()
+            return
+        first = PortSet(p for p in self.order if p in self)
+        yield from (p for p in dict.fromkeys(self.order) if p in first)
+        yield from (p for p in self.ascending() if p not in first)
+    
+    def ascending(self):
+        for index, byte in enumerate(self.bits):
+            if not byte:
+                continue
+            base = index << 3
+            for bit in range(8):
+                if byte >> bit & 1:
+                    yield base + bit
+    
+    def __eq__(self, other):
+        return isinstance(other, PortSet) and self.bits == other.bits
+    
+    def __repr__(self):
+        return f"PortSet('{self.to_spec()}')"
+    
+    def ranges(self):
+        start = prev = None
+        for port in self.ascending():
+            if start is None:
+                start = prev = port
+            elif port == prev + 1:
+                prev = port
+            else:
+                yield start, prev
+                start = prev = port
+        if start is not None:
+            yield start, prev
+    
+    def to_spec(self):
+        return ",".join(str(a) if a == b else f"{a}-{b}" for a, b in self.ranges())
+    
+    def difference(self, other):
+        result = PortSet(order=self.order)
+        result.bits = bytearray(a & ~b & 0xFF for a, b in zip(self.bits, other.bits))
+        return result
+    
+    def intersection(self, other):
+        result = PortSet(order=self.order)
+        result.bits = bytearray(a & b for a, b in zip(self.bits, other.bits))
+        return result
+    
+    def shard(self, index, count):
+        # порты раздаются по кругу, поэтому шарды получаются одинакового размера даже для плотных диапазонов
+        return PortSet((port for i, port in enumerate(self) if i % count == index), self.order)
+    
+    def to_bytes(self):
+        return bytes(self.bits)
+    
+    @classmethod
+    def from_bytes(cls, data, order=None):
+        port_set = cls(order=order)
+        port_set.bits[:len(data)] = data[:8192]
+        return port_set
+
+def named_ports(name):
+    name = name.lower()
+    if name == "all":
+        return range(1, 65536)
+    if name.startswith("top"):
+        return service_table.top_ports(int(name[3:] or 100))
+    if name.startswith("udp-top"):
+        return service_table.top_ports(int(name[7:] or 100), "udp")
+    if name in NAMED_SETS:
+        return NAMED_SETS[name]
+    return None
+
+def named_ranges(ports):
+    if isinstance(ports, range):
+        return [(ports.start, ports.stop - 1)]
+    return [(p, p) for p in ports]
+
+def parse_token(token, named=None):
+    # named - уже разрешенный именованный набор: topN не строится (и не предупреждает) второй раз
+    ports = named if named is not None else named_ports(token)
+    if ports is not None:
+        return named_ranges(ports)
+    
+    try:
+        if "-" in token:
+            start, end = token.split("-", 1)
+            start = int(start) if start else 1
+            end = int(end) if end else 65535
+        else:
+            start = end = int(token)
+    except ValueError:
+        raise ValueError(f"неверный порт: {token}")
+    
+    # порт 0 зарезервирован, connect на него бессмыслен
+    if not 1 <= start <= end <= 65535:
+        raise ValueError(f"неверный диапазон портов: {token}")
+    return [(start, end)]
+
+def parse_ports(spec, exclude=None):
+    # "22,80,443,8000-9000", "top100,web", "1-1024,!135-139"
+    port_set = PortSet()
+    excluded = []
+    
+    for token in spec.replace(" ", "").split(","):
+        if not token:
+            continue
+        if token.startswith("!"):
+            excluded.append(token[1:])
+            continue
+        # порядок именованных наборов сохраняется: top10 начинается с 80, 23, 443, а не с 21
+        named = named_ports(token)
+        if named is not None and not isinstance(named, range):
+            port_set.order.extend(named)
+        for start, end in parse_token(token, named):
+            port_set.add_range(start, end)
+    
+    if exclude:
+        excluded.extend(t for t in exclude.replace(" ", "").split(",") if t)
+    for token in excluded:
+        for start, end in parse_token(token):
+            port_set.discard_range(start, end)
+    
+    return port_set
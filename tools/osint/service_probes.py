@@ -0,0 +1,291 @@
+import asyncio
+import os
+import re
+
+# база проб в формате nmap-service-probes: сначала NULL (ждем приветствие), потом пробы по подсказкам портов и редкости.
+# если в системе установлен nmap, берется его база целиком, иначе встроенное подмножество из backend
+NMAP_PROBES_PATHS = ["/usr/share/nmap/nmap-service-probes", "/usr/local/share/nmap/nmap-service-probes"]
+BUNDLED_PROBES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "backend", "service_probes.txt")
+DEFAULT_INTENSITY = 7
+MAX_RESPONSE = 4096
+
+ESCAPES = {"\\": "\\", "0": "\0", "a": "\a", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t", "v": "\v"}
+FIELD_RE = re.compile(r"(cpe:|[pvihod])([^\w\s])(.*?)\2a?")
+TEMPLATE_RE = re.compile(r"\$P\((\d)\)|\$SUBST\((\d),\"([^\"]*)\",\"([^\"]*)\"\)|\$(\d)")
+FIELD_NAMES = {"p": "product", "v": "version", "i": "info", "h": "hostname", "o": "os", "d": "device"}
+
+_database = None
+
+def unescape(text):
+    result = []
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if char == "\\" and i + 1 < len(text):
+            nxt = text[i + 1]
+            if nxt == "x" and i + 3 < len(text):
+                result.append(chr(int(text[i + 2:i + 4], 16)))
+                i += 4
+                continue
+            result.append(ESCAPES.get(nxt, nxt))
+            i += 2
+            continue
+        result.append(char)
+        i += 1
+    return "".join(result).encode('latin-1')
+
+def printable(data):
+    return "".join(chr(b) if 32 <= b < 127 else "." for b in data)
+
+class Match:
+    def __init__(self, service, regex, fields, soft=False):
+        self.service = service
+        self.regex = regex
+        self.fields = fields
+        self.soft = soft
+    
+    def apply(self, data):
+        found = self.regex.search(data)
+        if found is None:
+            return None
+        
+        def group(index):
+            index = int(index)
+            return (found.group(index) if index <= self.regex.groups else None) or b""
+        
+        def substitute(m):
+            if m.group(1):
+                return printable(group(m.group(1)))
+            if m.group(2):
+                return group(m.group(2)).decode('latin-1').replace(m.group(3), m.group(4))
+            return group(m.group(5)).decode('latin-1')
+        
+        result = {"service": self.service, "confident": not self.soft}
+        for key, template in self.fields.items():
+            value = TEMPLATE_RE.sub(substitute, template).strip(" ;")
+            if value:
+                result[key] = value
+        return result
+
+class Probe:
+    def __init__(self, name, payload):
+        self.name = name
+        self.payload = payload
+        self.rarity = 0 if name == "NULL" else 1
+        self.ports = set()
+        self.wait = 5
+        self.fallback = []
+        self.matches = []
+    
+    def can_match(self, service):
+        return any(m.service == service and not m.soft for m in self.matches)
+
+class ProbeDatabase:
+    def __init__(self, probes):
+        self.probes = probes
+        self.by_name = {p.name: p for p in probes}
+        self.null = self.by_name.get("NULL")
+        self.order_cache = {}
+    
+    def probes_for_port(self, port, intensity=DEFAULT_INTENSITY):
+        # как в nmap: проба с подсказкой порта идет всегда, без подсказки - только если rarity <= intensity
+        key = (port, intensity)
+        if key not in self.order_cache:
+            hinted = [p for p in self.probes if p is not self.null and port in p.ports]
+            rest = [p for p in self.probes if p is not self.null and port not in p.ports and p.rarity <= intensity]
+            ordered = sorted(hinted, key=lambda p: p.rarity) + sorted(rest, key=lambda p: p.rarity)
+            self.order_cache[key] = ([self.null] if self.null else []) + ordered
+        return self.order_cache[key]
+    
+    def match(self, probe, data):
+        # сначала правила самой пробы, потом fallback-пробы и NULL, как в nmap
+        soft = None
+        chain = [probe] + [self.by_name[n] for n in probe.fallback if n in self.by_name]
+        if self.null and self.null not in chain:
+            chain.append(self.null)
+        for source in chain:
+            for match in source.matches:
+                result = match.apply(data)
+                if result is None:
+                    continue
+                if result["confident"]:
+                    return result
+                soft = soft or result
+        return soft
+
+def parse_ports_hint(text):
+    ports = set()
+    for token in text.split(","):
+        token = token.strip()
+        if "-" in token:
+            start, end = token.split("-", 1)
+            ports.update(range(int(start), int(end) + 1))
+        elif token.isdigit():
+            ports.add(int(token))
+    return ports
+
+def parse_match(line, soft):
+    service, rest = line.split(" ", 1)
+    if len(rest) < 3 or rest[0] != "m":
+        return None
+    delim = rest[1]
+    end = rest.find(delim, 2)
+    if end == -1:
+        return None
+    
+    pattern = rest[2:end]
+    tail = rest[end + 1:]
+    flags_end = len(tail) - len(tail.lstrip("is"))
+    flags = re.DOTALL if "s" in tail[:flags_end] else 0
+    if "i" in tail[:flags_end]:
+        flags |= re.IGNORECASE
+    
+    try:
+        regex = re.compile(pattern.encode('latin-1'), flags)
+    except (re.error, OverflowError):
+        # часть правил nmap использует синтаксис pcre, которого нет в re; такие правила пропускаются
+        return None
+    
+    fields = {FIELD_NAMES[key]: value for key, _, value in FIELD_RE.findall(tail[flags_end:]) if key in FIELD_NAMES}
+    return Match(service, regex, fields, soft)
+
+def parse_probes_file(path):
+    probes = []
+    probe = None
+    with open(path, 'r', encoding='latin-1') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            directive, _, rest = line.partition(" ")
+            
+            if directive == "Probe":
+                proto, name, payload = rest.split(" ", 2)
+                probe = None
+                if proto != "TCP" or not payload.startswith("q") or len(payload) < 3:
+                    continue
+                probe = Probe(name, unescape(payload[2:payload.rfind(payload[1])]))
+                probes.append(probe)
+            elif probe is None:
+                continue
+            elif directive in ("match", "softmatch"):
+                match = parse_match(rest, directive == "softmatch")
+                if match:
+                    probe.matches.append(match)
+            elif directive == "rarity":
+                probe.rarity = int(rest)
+            elif directive == "ports":
+                probe.ports = parse_ports_hint(rest)
+            elif directive == "totalwaitms":
+                probe.wait = int(rest) / 1000
+            elif directive == "fallback":
+                probe.fallback = [n.strip() for n in rest.split(",")]
+    return probes
+
+def load_database():
+    for path in NMAP_PROBES_PATHS + [BUNDLED_PROBES_PATH]:
+        if os.path.exists(path):
+            try:
+                return ProbeDatabase(parse_probes_file(path))
+            except (OSError, ValueError):
+                continue
+    return ProbeDatabase([])
+
+def get_database():
+    global _database
+    if _database is None:
+        _database = load_database()
+    return _database
+
+async def send_probe(host, port, payload, timeout=1, wait=2):
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout=timeout)
+    try:
+        if payload:
+            writer.write(payload)
+            await writer.drain()
+        
+        data = b""
+        try:
+            data = await asyncio.wait_for(reader.read(MAX_RESPONSE), timeout=wait)
+            # ответ может прийти несколькими сегментами; дочитываем, пока сервер быстро отдает данные
+            while data and len(data) < MAX_RESPONSE:
+                chunk = await asyncio.wait_for(reader.read(MAX_RESPONSE - len(data)), timeout=0.1)
+                if not chunk:
+                    break
+                data += chunk
+        except asyncio.TimeoutError:
+            pass
+        return data
+    finally:
+        writer.close()
+
+async def probe_service(host, port, timeout=1, deadline=3, intensity=DEFAULT_INTENSITY, max_wait=2):
+    # пробы идут по очереди до первого уверенного совпадения; softmatch сужает дальнейшие пробы до тех,
+    # у которых есть правила для найденного сервиса. deadline - общий предел на все пробы порта
+    database = get_database()
+    loop = asyncio.get_running_loop()
+    end = loop.time() + deadline
+    best = None
+    first_response = b""
+    first_probe = None
+    soft_service = None
+    sent = 0
+    
+    for probe in database.probes_for_port(port, intensity):
+        if soft_service and not probe.can_match(soft_service):
+            continue
+        remaining = end - loop.time()
+        if remaining <= 0:
+            break
+        
+        sent += 1
+        try:
+            data = await send_probe(host, port, probe.payload, min(timeout, remaining), min(probe.wait, max_wait, remaining))
+        except (OSError, asyncio.TimeoutError):
+            # закрытый порт видно уже на NULL-пробе, дальше пробовать нечего
+            if sent == 1:
+                return None
+            continue
+        
+        if not data:
+            continue
+        if not first_response:
+            first_response, first_probe = data, probe.name
+        
+        result = database.match(probe, data)
+        if result is None:
+            continue
+        result["probe"] = probe.name
+        result["banner"] = data
+        if result["confident"]:
+            best = result
+            break
+        if best is None:
+            best = result
+            soft_service = result["service"]
+    
+    if best is None:
+        if not first_response:
+            return None
+        best = {"service": None, "confident": False, "probe": first_probe, "banner": first_response}
+    
+    best["probes_sent"] = sent
+    return best
+
+async def reprobe(host, port, probe_name, timeout=1, deadline=3, max_wait=2):
+    # одна проба, которая в прошлый раз дала ответ: хватает, чтобы понять, изменился ли сервис.
+    # None - порт не отвечает
+    database = get_database()
+    probe = database.by_name.get(probe_name) or database.null
+    if probe is None:
+        return None
+    
+    try:
+        async with asyncio.timeout(deadline):
+            data = await send_probe(host, port, probe.payload, timeout, min(probe.wait, max_wait))
+    except (OSError, asyncio.TimeoutError):
+        return None
+    
+    result = (database.match(probe, data) if data else None) or {"service": None, "confident": False}
+    result.update(probe=probe.name, banner=data, probes_sent=1)
+    return result
@@ -0,0 +1,165 @@
+import os
+import warnings
+from array import array
+
+# порт, имя сервиса, доля хостов где порт открыт (приблизительно по nmap-services).
+# если в системе установлен nmap, таблица берется из его nmap-services целиком
+TCP_SERVICES = [
+    (80, "http", 0.484143), (23, "telnet", 0.221265), (443, "https", 0.208669),
+    (21, "ftp", 0.197667), (22, "ssh", 0.182286), (25, "smtp", 0.131314),
+    (3389, "ms-wbt-server", 0.083904), (110, "pop3", 0.077142), (445, "microsoft-ds", 0.056944),
+    (139, "netbios-ssn", 0.050809), (143, "imap", 0.050283), (53, "domain", 0.048463),
+    (135, "msrpc", 0.047804), (3306, "mysql", 0.045846), (8080, "http-proxy", 0.042052),
+    (1723, "pptp", 0.031188), (111, "rpcbind", 0.030151), (995, "pop3s", 0.029921),
+    (993, "imaps", 0.027199), (5900, "vnc", 0.023076), (1025, "NFS-or-IIS", 0.022021),
+    (587, "submission", 0.019721), (8888, "sun-answerbook", 0.016154), (199, "smux", 0.015870),
+    (1720, "h323q931", 0.014277), (465, "smtps", 0.013888), (548, "afp", 0.012604),
+    (113, "ident", 0.012079), (81, "hosts2-ns", 0.012057), (6001, "X11:1", 0.011009),
+    (10000, "snet-sensor-mgmt", 0.010362), (514, "shell", 0.010289), (5060, "sip", 0.010283),
+    (179, "bgp", 0.010149), (1026, "LSA-or-nterm", 0.009955), (2000, "cisco-sccp", 0.009950),
+    (8443, "https-alt", 0.009710), (8000, "http-alt", 0.009692), (32768, "filenet-tms", 0.009220),
+    (554, "rtsp", 0.009064), (26, "rsftp", 0.008983), (1433, "ms-sql-s", 0.007929),
+    (49152, "unknown", 0.007803), (2001, "dc", 0.007635), (515, "printer", 0.007348),
+    (8008, "http", 0.007125), (49154, "unknown", 0.006880), (1027, "IIS", 0.006843),
+    (5666, "nrpe", 0.006809), (646, "ldp", 0.006739), (5000, "upnp", 0.006650),
+    (5631, "pcanywheredata", 0.006555), (631, "ipp", 0.006424), (49153, "unknown", 0.006342),
+    (8081, "blackice-icecap", 0.006335), (2049, "nfs", 0.006309), (88, "kerberos-sec", 0.006213),
+    (79, "finger", 0.006087), (5800, "vnc-http", 0.005945), (106, "pop3pw", 0.005847),
+    (2121, "ccproxy-ftp", 0.005788), (1110, "nfsd-status", 0.005644), (49155, "unknown", 0.005599),
+    (6000, "X11", 0.005539), (513, "login", 0.005522), (990, "ftps", 0.005506),
+    (5357, "wsdapi", 0.005484), (427, "svrloc", 0.005462), (49156, "unknown", 0.005450),
+    (543, "klogin", 0.005282), (544, "kshell", 0.005272), (5101, "admdog", 0.005134),
+    (144, "news", 0.005085), (7, "echo", 0.004855), (389, "ldap", 0.004812),
+    (8009, "ajp13", 0.004798), (3128, "squid-http", 0.004782), (444, "snpp", 0.004737),
+    (9999, "abyss", 0.004724), (5009, "airport-admin", 0.004646), (7070, "realserver", 0.004646),
+    (5190, "aol", 0.004614), (3000, "ppp", 0.004553), (5432, "postgresql", 0.004540),
+    (1900, "upnp", 0.004484), (3986, "mapper-ws_ethd", 0.004460), (13, "daytime", 0.004442),
+    (1029, "ms-lsa", 0.004368), (9, "discard", 0.004358), (5051, "ida-agent", 0.004350),
+    (6646, "unknown", 0.004244), (49157, "unknown", 0.004213), (1028, "unknown", 0.004181),
+    (873, "rsync", 0.004154), (1755, "wms", 0.004141), (2717, "pn-requester", 0.004104),
+    (4899, "radmin", 0.004103), (9100, "jetdirect", 0.004097), (119, "nntp", 0.004069),
+    (37, "time", 0.003993), (6379, "redis", 0.000627), (27017, "mongod", 0.000451),
+    (9200, "elasticsearch", 0.000420), (11211, "memcache", 0.000376), (5672, "amqp", 0.000376),
+    (5984, "couchdb", 0.000150), (2375, "docker", 0.000150), (2376, "docker-s", 0.000150),
+    (7474, "neo4j", 0.000100), (8500, "fmtp", 0.000652), (9300, "vrace", 0.000100),
+    (1521, "oracle", 0.001504), (50000, "ibm-db2", 0.002033), (6443, "sun-sr-https", 0.000150),
+]
+
+UDP_SERVICES = [
+    (631, "ipp", 0.450281), (161, "snmp", 0.433467), (137, "netbios-ns", 0.365163),
+    (123, "ntp", 0.330879), (138, "netbios-dgm", 0.297830), (1434, "ms-sql-m", 0.293184),
+    (445, "microsoft-ds", 0.253118), (135, "msrpc", 0.244452), (67, "dhcps", 0.228010),
+    (53, "domain", 0.213496), (139, "netbios-ssn", 0.211973), (500, "isakmp", 0.163742),
+    (68, "dhcpc", 0.140118), (520, "route", 0.139376), (1900, "upnp", 0.136543),
+    (4500, "nat-t-ike", 0.124467), (514, "syslog", 0.119804), (49152, "unknown", 0.109933),
+    (162, "snmptrap", 0.103679), (69, "tftp", 0.102913), (5353, "zeroconf", 0.100166),
+    (111, "rpcbind", 0.093988), (49154, "unknown", 0.087528), (1701, "L2TP", 0.052231),
+    (998, "puparp", 0.051210), (996, "vsinet", 0.044780), (997, "maitrd", 0.042216),
+    (999, "applix", 0.041887), (3283, "netassistant", 0.040592), (1645, "radius", 0.038542),
+    (1812, "radius", 0.037306), (1813, "radacct", 0.035802), (11211, "memcache", 0.001003),
+    (5060, "sip", 0.018326), (1194, "openvpn", 0.003421), (3478, "stun", 0.001504),
+]
+
+NMAP_SERVICES_PATHS = ["/usr/share/nmap/nmap-services", "/usr/local/share/nmap/nmap-services"]
+SYSTEM_SERVICES_PATH = "/etc/services"
+
+_table = None
+
+class ServiceTable:
+    # на каждый протокол два массива по 65536 элементов: индекс имени (uint16) и частота (float32)
+    def __init__(self):
+        self.names = ["unknown"]
+        self.name_ids = {"unknown": 0}
+        self.index = {proto: array('H', bytes(2 * 65536)) for proto in ("tcp", "udp")}
+        self.frequency = {proto: array('f', bytes(4 * 65536)) for proto in ("tcp", "udp")}
+        self.ranked = {}
+    
+    def add(self, port, proto, name, frequency=None, override=True):
+        if proto not in self.index or not 0 <= port <= 65535:
+            return
+        if self.index[proto][port] and not override:
+            return
+        
+        name_id = self.name_ids.get(name)
+        if name_id is None:
+            name_id = len(self.names)
+            self.names.append(name)
+            self.name_ids[name] = name_id
+        
+        self.index[proto][port] = name_id
+        if frequency is not None:
+            self.frequency[proto][port] = frequency
+    
+    def name(self, port, proto="tcp"):
+        try:
+            return self.names[self.index[proto][port]]
+        except (KeyError, IndexError):
+            return "unknown"
+    
+    def top_ports(self, count=100, proto="tcp"):
+        # сначала порты с известной частотой, за ними - просто известные сервисы (/etc/services) по возрастанию
+        ranked = self.ranked.get(proto)
+        if ranked is None:
+            frequency = self.frequency[proto]
+            index = self.index[proto]
+            by_frequency = sorted((p for p in range(65536) if frequency[p] > 0), key=lambda p: -frequency[p])
+            ranked = (by_frequency, by_frequency + [p for p in range(1, 65536) if index[p] and not frequency[p] > 0])
+            self.ranked[proto] = ranked
+        
+        by_frequency, known = ranked
+        if count > len(by_frequency):
+            warnings.warn(f"top{count}/{proto}: частоты известны только для {len(by_frequency)} портов (nmap-services не найден), "
+                          f"дополнено известными сервисами до {min(count, len(known))}", RuntimeWarning, stacklevel=3)
+        return known[:count]
+
+def parse_services_file(path, table, with_frequency, override):
+    try:
+        with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+            for line in f:
+                fields = line.split("#", 1)[0].split()
+                if len(fields) < 2 or "/" not in fields[1]:
+                    continue
+                port, proto = fields[1].split("/", 1)
+                frequency = None
+                if with_frequency and len(fields) > 2:
+                    try:
+                        frequency = float(fields[2])
+                    except ValueError:
+                        pass
+                try:
+                    table.add(int(port), proto, fields[0], frequency, override)
+                except ValueError:
+                    continue
+    except OSError:
+        return False
+    return True
+
+def build_table():
+    table = ServiceTable()
+    
+    for path in NMAP_SERVICES_PATHS:
+        if os.path.isfile(path) and parse_services_file(path, table, with_frequency=True, override=True):
+            break
+    else:
+        for port, name, frequency in TCP_SERVICES:
+            table.add(port, "tcp", name, frequency)
+        for port, name, frequency in UDP_SERVICES:
+            table.add(port, "udp", name, frequency)
+    
+    parse_services_file(SYSTEM_SERVICES_PATH, table, with_frequency=False, override=False)
+    return table
+
+def get_table():
+    global _table
+    if _table is None:
+        _table = build_table()
+    return _table
+
+def service_name(port, proto="tcp"):
+    return get_table().name(port, proto)
+
+def port_frequency(port, proto="tcp"):
+    return get_table().frequency[proto][port]
+
+def top_ports(count=100, proto="tcp"):
+    return get_table().top_ports(count, proto)
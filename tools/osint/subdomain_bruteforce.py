@@ -1,60 +1,384 @@
 import asyncio
+import random
+import string
+import time
 import aiohttp
-import socket
+import dns.asyncresolver
+import dns.exception
+import dns.resolver
+from tools.osint import dns_client, dns_standin, subdomain_permutations
 
-async def check_subdomain(session, subdomain, domain, timeout=3):
-    full_domain = f"{subdomain}.{domain}"
+DNS_TIMEOUT = 2
+DNS_RETRIES = 2
+DNS_CONCURRENCY = 200
+WILDCARD_SAMPLES = 3
+HTTP_TIMEOUT = 3
+
+def make_resolver(nameservers=None, timeout=DNS_TIMEOUT, port=53, engine="udp"):
+    # без явных серверов берутся системные из resolv.conf. "udp" - свой клиент с мультиплексированием
+    # запросов и оценкой резолверов, "dnspython" - асинхронный резолвер dnspython (сокет на каждый запрос)
+    if engine == "udp":
+        return dns_client.UdpDnsClient(nameservers, port, timeout, DNS_RETRIES)
+    resolver = dns.asyncresolver.Resolver(configure=not nameservers)
+    if nameservers:
+        resolver.nameservers = list(nameservers)
+    resolver.port = port
+    resolver.timeout = timeout
+    resolver.lifetime = timeout
+    return resolver
+
+async def resolve_answer(resolver, name, limit=None, retries=DNS_RETRIES):
+    # (адреса, цель cname или None); nxdomain и пустой ответ окончательны,
+    # повторяются только таймауты и отказы серверов
+    limit = limit or asyncio.Semaphore(1)
+    if isinstance(resolver, dns_client.UdpDnsClient):
+        async with limit:
+            return await resolver.resolve_address(name)
+    for _ in range(retries + 1):
+        try:
+            async with limit:
+                answer = await resolver.resolve(name, "A")
+            cname = answer.canonical_name if answer.canonical_name != answer.qname else None
+            return [r.address for r in answer], cname.to_text().rstrip(".").lower() if cname else None
+        except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer):
+            return None
+        except (dns.exception.Timeout, dns.resolver.NoNameservers):
+            continue
+        except dns.exception.DNSException:
+            return None
+    return None
+
+async def resolve_name(resolver, name, limit=None, retries=DNS_RETRIES):
+    answer = await resolve_answer(resolver, name, limit, retries)
+    return answer[0] if answer else None
+
+def random_label(length=12):
+    return "".join(random.choices(string.ascii_lowercase + string.digits, k=length))
+
+class WildcardFilter:
+    # для каждой зоны (domain, api.domain, ...) несколько случайных имен: все, что они вернули, - ответ wildcard.
+    # кандидат, чьи адреса целиком входят в этот набор или чей cname совпадает, отбрасывается без http-проверки
+    def __init__(self, resolver, limit=None, samples=WILDCARD_SAMPLES):
+        self.resolver = resolver
+        self.limit = limit
+        self.samples = samples
+        self.zones = {}
+        self.filtered = 0
+    
+    async def probe(self, zone):
+        answers = await asyncio.gather(*(resolve_answer(self.resolver, f"{random_label()}.{zone}", self.limit) for _ in range(self.samples)))
+        ips = set()
+        cnames = set()
+        for answer in answers:
+            if answer:
+                ips.update(answer[0])
+                if answer[1]:
+                    cnames.add(answer[1])
+        return (ips, cnames) if ips or cnames else None
     
+    async def wildcard(self, zone):
+        # одновременные кандидаты одной зоны ждут одну и ту же пробу
+        task = self.zones.get(zone)
+        if task is None:
+            task = asyncio.ensure_future(self.probe(zone))
+            self.zones[zone] = task
+        return await asyncio.shield(task)
+    
+    async def matches(self, name, answer):
+        wildcard = await self.wildcard(name.split(".", 1)[1])
+        if wildcard is None:
+            return False
+        ips, cname = answer
+        if (cname and cname in wildcard[1]) or (ips and set(ips) <= wildcard[0]):
+            self.filtered += 1
+            return True
+        return False
+    
+    def detected(self):
+        return {zone: task.result() for zone, task in self.zones.items() if task.done() and not task.cancelled() and task.result()}
+
+async def resolve_subdomain(subdomain, domain, resolver=None, dns_limit=None, wildcards=None):
+    # (имя, адрес) или None; ответы wildcard отбрасываются здесь же, до http
+    full_domain = f"{subdomain}.{domain}"
+    answer = await resolve_answer(resolver or make_resolver(), full_domain, dns_limit)
+    if not answer or not answer[0]:
+        return None
+    if wildcards and await wildcards.matches(full_domain, answer):
+        return None
+    return full_domain, answer[0][0]
+
+async def probe_url(session, scheme, full_domain, ip, timeout=HTTP_TIMEOUT):
+    # соединяемся с уже найденным адресом, имя уходит в host и sni: второго dns-запроса нет.
+    # head дешевле get; на 405/501 и на обрыв соединения после head пробуем get
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    host = f"[{ip}]" if ":" in ip else ip
+    options = {"server_hostname": full_domain} if scheme == "https" else {}
+    for method in ("HEAD", "GET"):
+        try:
+            async with session.request(method, f"{scheme}://{host}/", headers={"Host": full_domain}, timeout=client_timeout,
+                                       ssl=False, allow_redirects=False, **options) as response:
+                if response.status in (405, 501) and method == "HEAD":
+                    continue
+                return response.status if response.status < 400 else None
+        except asyncio.TimeoutError:
+            return None
+        except (aiohttp.ClientError, OSError, ValueError):
+            if method == "GET":
+                return None
+    return None
+
+async def probe_http(session, full_domain, ip, timeout=HTTP_TIMEOUT):
+    # http и https проверяются одновременно, первый успешный ответ отменяет второй запрос
+    tasks = [asyncio.create_task(probe_url(session, scheme, full_domain, ip, timeout)) for scheme in ("http", "https")]
     try:
-        ip = socket.gethostbyname(full_domain)
-        
-        protocols = [f"http://{full_domain}", f"https://{full_domain}"]
-        for url in protocols:
-            try:
-                async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout), ssl=False) as response:
-                    if response.status < 400:
-                        return (full_domain, ip, response.status, "active")
-            except:
-                pass
-        
-        return (full_domain, ip, 0, "dns_only")
-    except:
+        for next_done in asyncio.as_completed(tasks):
+            status = await next_done
+            if status is not None:
+                return status
         return None
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+async def check_subdomain(session, subdomain, domain, timeout=HTTP_TIMEOUT, resolver=None, dns_limit=None, wildcards=None):
+    resolved = await resolve_subdomain(subdomain, domain, resolver, dns_limit, wildcards)
+    if resolved is None:
+        return None
+    full_domain, ip = resolved
+    status = await probe_http(session, full_domain, ip, timeout)
+    if status is not None:
+        return (full_domain, ip, status, "active")
+    return (full_domain, ip, 0, "dns_only")
+
+DEFAULT_WORDLIST = [
+    'www', 'mail', 'ftp', 'admin', 'api', 'dev', 'test', 'blog', 'panel',
+    'webmail', 'portal', 'cdn', 'static', 'assets', 'img', 'images',
+    'shop', 'store', 'app', 'mobile', 'm', 'support', 'help', 'docs',
+    'status', 'monitor', 'stats', 'analytics', 'crm', 'erp', 'vpn',
+    'secure', 'auth', 'login', 'signin', 'owa', 'exchange', 'remote',
+    'ns1', 'ns2', 'dns1', 'dns2', 'mx1', 'mx2', 'smtp', 'pop', 'imap',
+    'git', 'svn', 'jenkins', 'ci', 'staging', 'prod', 'beta', 'alpha'
+]
+PROGRESS_INTERVAL = 1
+# запас фильтра блума на кандидатов-перестановок сверх словаря
+PERMUTATION_CAPACITY = 1_000_000
+
+class BruteforceStats:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.tried = 0
+        self.resolved = 0
+        self.found = 0
+        self.wildcards = None
+        self.resolver = None
+    
+    @property
+    def filtered(self):
+        return self.wildcards.filtered if self.wildcards else 0
+    
+    def rate(self):
+        elapsed = time.monotonic() - self.started
+        return self.tried / elapsed if elapsed > 0 else 0.0
+    
+    def line(self):
+        return f"проверено {self.tried}, в dns {self.resolved}, найдено {self.found}, wildcard {self.filtered}, {self.rate():.0f} имен/сек"
+
+def read_words(f):
+    with f:
+        for line in f:
+            word = line.strip().lower()
+            if word and not word.startswith("#"):
+                yield word
+
+def iter_wordlist(wordlist=None):
+    # файл открывается сразу (ошибка в пути - OSError здесь, а не в фоновой задаче),
+    # а читается построчно: сколько бы строк в нем ни было, в памяти только текущая
+    if wordlist is None:
+        return iter(DEFAULT_WORDLIST)
+    if isinstance(wordlist, str):
+        return read_words(open(wordlist, 'r', encoding='utf-8', errors='ignore'))
+    return iter(wordlist)
 
-async def subdomain_bruteforce(domain, wordlist=None, max_concurrent=100):
+def count_words(wordlist=None):
+    # размер словаря для фильтра блума: файл просматривается блоками, строки не декодируются
     if wordlist is None:
-        wordlist = [
-            'www', 'mail', 'ftp', 'admin', 'api', 'dev', 'test', 'blog', 'panel',
-            'webmail', 'portal', 'cdn', 'static', 'assets', 'img', 'images',
-            'shop', 'store', 'app', 'mobile', 'm', 'support', 'help', 'docs',
-            'status', 'monitor', 'stats', 'analytics', 'crm', 'erp', 'vpn',
-            'secure', 'auth', 'login', 'signin', 'owa', 'exchange', 'remote',
-            'ns1', 'ns2', 'dns1', 'dns2', 'mx1', 'mx2', 'smtp', 'pop', 'imap',
-            'git', 'svn', 'jenkins', 'ci', 'staging', 'prod', 'beta', 'alpha'
-        ]
+        return len(DEFAULT_WORDLIST)
+    if isinstance(wordlist, str):
+        with open(wordlist, 'rb') as f:
+            return sum(chunk.count(b"\n") for chunk in iter(lambda: f.read(1 << 20), b"")) + 1
+    return len(wordlist) if hasattr(wordlist, "__len__") else 0
+
+async def report_progress(stats, on_progress, interval=PROGRESS_INTERVAL):
+    while True:
+        await asyncio.sleep(interval)
+        on_progress(stats)
+
+async def iter_bruteforce(domain, wordlist=None, max_concurrent=100, dns_concurrency=DNS_CONCURRENCY, nameservers=None, stats=None, on_progress=None, resolver=None, seen=None, http_timeout=HTTP_TIMEOUT, wildcards=None):
+    # два этапа со своими пулами воркеров: dns_concurrency резолвят слова, max_concurrent проверяют http.
+    # между этапами ограниченные очереди: медленные веб-серверы не тормозят резолвинг сверх буфера,
+    # а память не растет с размером словаря. найденные имена отдаются сразу.
+    # wildcards, как resolver и seen, можно передать общий на несколько проходов: зоны не проверяются заново, счетчик общий
+    source = iter_wordlist(wordlist)
+    stats = stats or BruteforceStats()
+    own_resolver = resolver is None
+    resolver = resolver or make_resolver(nameservers)
+    stats.resolver = resolver
+    dns_limit = asyncio.Semaphore(dns_concurrency)
+    wildcards = wildcards or WildcardFilter(resolver, dns_limit)
+    stats.wildcards = wildcards
+    await wildcards.wildcard(domain)
     
-    found = []
-    connector = aiohttp.TCPConnector(limit=max_concurrent, ssl=False)
+    words = asyncio.Queue(maxsize=dns_concurrency * 2)
+    resolved = asyncio.Queue(maxsize=max_concurrent * 2)
+    results = asyncio.Queue(maxsize=max_concurrent)
     
-    async with aiohttp.ClientSession(connector=connector) as session:
-        tasks = []
-        for sub in wordlist:
-            task = asyncio.create_task(check_subdomain(session, sub, domain))
-            tasks.append(task)
-        
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+    async def produce():
+        for word in source:
+            # слова словаря только запоминаются для отсева перестановок, сами никогда не пропускаются:
+            # ложное срабатывание фильтра не должно стоить настоящего кандидата
+            if seen is not None:
+                seen.add(word)
+            await words.put(word)
+        for _ in range(dns_concurrency):
+            await words.put(None)
+    
+    async def resolve_worker():
+        while (word := await words.get()) is not None:
+            try:
+                name = await resolve_subdomain(word, domain, resolver, dns_limit, wildcards)
+            except (dns.exception.DNSException, ValueError):
+                name = None
+            stats.tried += 1
+            if name:
+                stats.resolved += 1
+                await resolved.put(name)
+    
+    async def close_resolved(workers):
+        await asyncio.gather(*workers)
+        for _ in range(max_concurrent):
+            await resolved.put(None)
     
-    for result in results:
-        if result and not isinstance(result, Exception):
-            found.append(result)
+    async def http_worker(session):
+        while (name := await resolved.get()) is not None:
+            full_domain, ip = name
+            try:
+                status = await probe_http(session, full_domain, ip, http_timeout)
+            except Exception:
+                status = None
+            stats.found += 1
+            await results.put((full_domain, ip, status, "active") if status is not None else (full_domain, ip, 0, "dns_only"))
+        await results.put(None)
     
+    connector = aiohttp.TCPConnector(limit=max_concurrent * 2, ssl=False)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        resolvers = [asyncio.create_task(resolve_worker()) for _ in range(dns_concurrency)]
+        # за этапами следим вместе с очередью результатов: упавшая задача не оставляет остальных ждать сигнала конца вечно
+        watched = {asyncio.create_task(produce()), asyncio.create_task(close_resolved(resolvers))}
+        watched.update(asyncio.create_task(http_worker(session)) for _ in range(max_concurrent))
+        tasks = resolvers + list(watched)
+        if on_progress:
+            tasks.append(asyncio.create_task(report_progress(stats, on_progress)))
+        
+        try:
+            running = max_concurrent
+            while running:
+                getter = asyncio.ensure_future(results.get())
+                tasks.append(getter)
+                while not getter.done():
+                    done, _ = await asyncio.wait(watched | {getter}, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done - {getter}:
+                        watched.discard(task)
+                        if task.exception():
+                            raise task.exception()
+                tasks.remove(getter)
+                result = getter.result()
+                if result is None:
+                    running -= 1
+                    continue
+                yield result
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if hasattr(source, "close"):
+                source.close()
+            if own_resolver and isinstance(resolver, dns_client.UdpDnsClient):
+                resolver.close()
+
+async def subdomain_bruteforce(domain, wordlist=None, max_concurrent=100, dns_concurrency=DNS_CONCURRENCY, nameservers=None, on_result=None, on_progress=None, stats=None, resolver=None, seen=None, wildcards=None):
+    found = []
+    async for result in iter_bruteforce(domain, wordlist, max_concurrent, dns_concurrency, nameservers, stats, on_progress, resolver, seen, wildcards=wildcards):
+        found.append(result)
+        if on_result:
+            on_result(result)
     return found
 
-def run_bruteforce(domain):
+def relative_name(name, domain):
+    return name[:-len(domain) - 1] if name.endswith("." + domain) else name
+
+async def permutation_scan(domain, found, words=None, numbers=None, rounds=1, seen=None, max_concurrent=100, dns_concurrency=DNS_CONCURRENCY,
+                           nameservers=None, on_result=None, on_progress=None, stats=None, resolver=None, wildcards=None):
+    # кандидаты генерируются лениво и идут в тот же конвейер резолвинга; найденное в раунде мутирует следующий раунд
+    seen = seen if seen is not None else subdomain_permutations.BloomFilter()
+    names = [relative_name(r[0], domain) for r in found]
+    for name in names:
+        seen.add(name)
+    
+    discovered = []
+    for _ in range(rounds):
+        candidates = subdomain_permutations.unique(subdomain_permutations.iter_permutations(names, words, numbers), seen)
+        round_found = await subdomain_bruteforce(domain, candidates, max_concurrent, dns_concurrency, nameservers, on_result, on_progress, stats, resolver, wildcards=wildcards)
+        if not round_found:
+            break
+        discovered.extend(round_found)
+        names = [relative_name(r[0], domain) for r in round_found]
+    return discovered
+
+def print_progress(stats):
+    print(f"\r  {stats.line()}", end="", flush=True)
+
+def print_found(result):
+    sub, ip, status, kind = result
+    details = f"[статус: {status}]" if kind == "active" else "[только dns]"
+    print(f"\r  [+] {sub} -> {ip} {details}".ljust(80))
+
+def run_bruteforce(domain, wordlist=None, permutations=False):
     print(f"запускаю brute force поддоменов для {domain}...")
     print("это может занять некоторое время...")
     
-    results = asyncio.run(subdomain_bruteforce(domain))
+    stats = BruteforceStats()
+    seen = subdomain_permutations.BloomFilter(count_words(wordlist) + PERMUTATION_CAPACITY) if permutations else None
+    
+    async def run():
+        # один резолвер и один фильтр wildcard на словарь и все раунды перестановок: найденные в словаре
+        # wildcard-зоны не проверяются заново, а итог по отброшенным считается за весь запуск
+        resolver = make_resolver()
+        wildcards = WildcardFilter(resolver)
+        try:
+            found = await subdomain_bruteforce(domain, wordlist, on_result=print_found, on_progress=print_progress, stats=stats, resolver=resolver, seen=seen, wildcards=wildcards)
+            print_progress(stats)
+            print()
+            
+            if permutations and found:
+                print(f"перебираю перестановки {len(found)} найденных имен...")
+                found += await permutation_scan(domain, found, seen=seen, on_result=print_found, on_progress=print_progress, stats=stats, resolver=resolver, wildcards=wildcards)
+                print_progress(stats)
+                print()
+        finally:
+            if isinstance(resolver, dns_client.UdpDnsClient):
+                resolver.close()
+        return found
+    
+    results = asyncio.run(run())
+    
+    if isinstance(stats.resolver, dns_client.UdpDnsClient):
+        print("резолверы:")
+        for line in stats.resolver.pool.lines():
+            print(f"  {line}")
+    
+    for zone, (ips, cnames) in stats.wildcards.detected().items():
+        print(f"wildcard *.{zone}: {', '.join(sorted(ips | cnames))} (отброшено совпадений всего: {stats.filtered})")
     
     if results:
         print(f"\nнайдено {len(results)} поддоменов:")
@@ -77,4 +401,41 @@ def run_bruteforce(domain):
     else:
         print("поддомены не найдены")
     
-    return results
\ No newline at end of file
+    return results
+
+def benchmark_resolution(words=10000, found_every=100, delay=0.02, serial_sample=200, dns_concurrency=DNS_CONCURRENCY):
+    # локальный сервер с задержкой ответа; последовательный проход - это старое поведение с gethostbyname,
+    # который блокировал цикл событий, поэтому он меряется на выборке и пересчитывается на весь список
+    async def run():
+        names = [f"w{i}.bench.test" for i in range(words)]
+        records = {name: ["10.0.0.1"] for name in names[::found_every]}
+        server, port = await dns_standin.start_standin(records, delay=delay)
+        resolver = make_resolver(["127.0.0.1"], port=port, engine="dnspython")
+        client = make_resolver(["127.0.0.1"], port=port)
+        
+        try:
+            started = time.perf_counter()
+            for name in names[:serial_sample]:
+                await resolve_name(resolver, name)
+            serial = (time.perf_counter() - started) / serial_sample * words
+            
+            limit = asyncio.Semaphore(dns_concurrency)
+            started = time.perf_counter()
+            answers = await asyncio.gather(*(resolve_name(resolver, name, limit) for name in names))
+            concurrent = time.perf_counter() - started
+            
+            started = time.perf_counter()
+            udp_answers = await asyncio.gather(*(resolve_name(client, name, limit) for name in names))
+            udp = time.perf_counter() - started
+        finally:
+            client.close()
+            server.transport.close()
+        
+        return serial, concurrent, udp, sum(1 for a in answers if a), sum(1 for a in udp_answers if a)
+    
+    serial, concurrent, udp, found, udp_found = asyncio.run(run())
+    print(f"последовательно: {serial:.1f} сек на {words} имен (оценка по {serial_sample})")
+    print(f"асинхронно (dnspython), {dns_concurrency} одновременно: {concurrent:.1f} сек, найдено {found}")
+    print(f"асинхронно (udp-клиент), {dns_concurrency} одновременно: {udp:.1f} сек, найдено {udp_found}")
+    print(f"ускорение: {serial / concurrent:.1f}x / {serial / udp:.1f}x")
+    return {"serial": serial, "concurrent": concurrent, "udp": udp, "found": found, "udp_found": udp_found}
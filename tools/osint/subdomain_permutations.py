@@ -0,0 +1,79 @@
+import hashlib
+import math
+import re
+
+# мутации найденных поддоменов: dev-api, api-dev, devapi, api2, api-2, staging.api ...
+PERMUTATION_WORDS = [
+    'dev', 'staging', 'stage', 'test', 'qa', 'uat', 'prod', 'beta', 'demo', 'old', 'new',
+    'internal', 'int', 'admin', 'api', 'app', 'web', 'backend', 'v1', 'v2', 'cdn', 'preprod', 'sandbox'
+]
+PERMUTATION_NUMBERS = ['1', '2', '3', '01', '02']
+DIGITS_RE = re.compile(r"\d+")
+
+class BloomFilter:
+    # вероятностное множество: "нет" - точно нет, "да" - с ошибкой error_rate, пока элементов не больше capacity.
+    # около 14.4 бит на имя при 0.1%: capacity=10 млн - около 18 мб вместо гигабайтов у set.
+    # сверх capacity доля ложных срабатываний быстро растет, поэтому емкость задается от размера входа
+    def __init__(self, capacity=2_000_000, error_rate=0.001):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+    
+    def positions(self, item):
+        # две половины одного blake2b дают все k позиций (схема Кирша-Митценмахера)
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+    
+    def __contains__(self, item):
+        return all(self.bits[p >> 3] >> (p & 7) & 1 for p in self.positions(item))
+    
+    def add(self, item):
+        # True, если элемента (вероятно) еще не было
+        new = False
+        for p in self.positions(item):
+            if not self.bits[p >> 3] >> (p & 7) & 1:
+                self.bits[p >> 3] |= 1 << (p & 7)
+                new = True
+        self.count += new
+        return new
+    
+    def __len__(self):
+        return self.count
+
+def iter_label_mutations(label, words=None, numbers=None):
+    words = words or PERMUTATION_WORDS
+    numbers = numbers or PERMUTATION_NUMBERS
+    for word in words:
+        if word == label:
+            continue
+        yield f"{word}-{label}"
+        yield f"{label}-{word}"
+        yield f"{word}{label}"
+        yield f"{label}{word}"
+    for number in numbers:
+        yield f"{label}{number}"
+        yield f"{label}-{number}"
+        if DIGITS_RE.search(label):
+            yield DIGITS_RE.sub(number, label, count=1)
+
+def iter_permutations(found, words=None, numbers=None):
+    # found - относительные имена (api, dev.api); мутирует первая метка, остальные сохраняются,
+    # плюс новый уровень слева: staging.api. ничего не накапливается, кандидаты отдаются по одному
+    words = words or PERMUTATION_WORDS
+    for name in found:
+        first, _, rest = name.partition(".")
+        suffix = "." + rest if rest else ""
+        for label in iter_label_mutations(first, words, numbers):
+            yield label + suffix
+        for word in words:
+            yield f"{word}.{name}"
+
+def unique(candidates, seen=None):
+    # уже проверенные имена (в том числе из основного перебора) пропускаются
+    seen = seen if seen is not None else BloomFilter()
+    for candidate in candidates:
+        if seen.add(candidate):
+            yield candidate
@@ -0,0 +1,196 @@
+import asyncio
+import hashlib
+import ipaddress
+import ssl
+from datetime import datetime, timezone
+
+# порты, где tls ждут сразу после connect; на остальных рукопожатие пробуется, только если пробы нашли ssl
+TLS_PORTS = {443, 465, 636, 853, 989, 990, 992, 993, 994, 995, 2083, 2087, 4443, 5986, 6443, 8443, 9443}
+TLS_SERVICES = {"ssl", "https", "tls"}
+
+OID_NAMES = {"2.5.4.3": "CN", "2.5.4.6": "C", "2.5.4.7": "L", "2.5.4.8": "ST", "2.5.4.10": "O", "2.5.4.11": "OU"}
+OID_SUBJECT_ALT_NAME = "2.5.29.17"
+TAG_DNS_NAME = 0x82
+TAG_IP_ADDRESS = 0x87
+
+_context = None
+
+def der_items(data, start=0, end=None):
+    # последовательный разбор der: (тег, начало значения, конец значения)
+    end = len(data) if end is None else end
+    pos = start
+    while pos < end:
+        tag = data[pos]
+        length = data[pos + 1]
+        pos += 2
+        if length & 0x80:
+            size = length & 0x7f
+            length = int.from_bytes(data[pos:pos + size], 'big')
+            pos += size
+        yield tag, pos, pos + length
+        pos += length
+
+def der_children(data, item):
+    return list(der_items(data, item[1], item[2]))
+
+def decode_oid(raw):
+    parts = [min(raw[0] // 40, 2), raw[0] - min(raw[0] // 40, 2) * 40]
+    value = 0
+    for byte in raw[1:]:
+        value = value << 7 | byte & 0x7f
+        if not byte & 0x80:
+            parts.append(value)
+            value = 0
+    return ".".join(map(str, parts))
+
+def decode_string(data, item):
+    raw = data[item[1]:item[2]]
+    if item[0] == 0x1e:
+        return raw.decode('utf-16-be', errors='replace')
+    return raw.decode('utf-8', errors='replace')
+
+def parse_name(data, item):
+    name = {}
+    for rdn in der_children(data, item):
+        for attribute in der_children(data, rdn):
+            oid, value = der_children(data, attribute)[:2]
+            key = OID_NAMES.get(decode_oid(data[oid[1]:oid[2]]))
+            if key:
+                name[key] = decode_string(data, value)
+    return name
+
+def time_text(data, item):
+    return data[item[1]:item[2]].decode('ascii', errors='replace')
+
+def parse_time(data, item):
+    # datetime в utc; None, если дата не разбирается
+    try:
+        parsed = datetime.strptime(time_text(data, item), "%y%m%d%H%M%SZ" if item[0] == 0x17 else "%Y%m%d%H%M%SZ")
+    except ValueError:
+        return None
+    # в UTCTime годы 50-99 - это 1950-1999 (rfc 5280), strptime относит 50-68 к 2000-м
+    if item[0] == 0x17 and parsed.year >= 2050:
+        parsed = parsed.replace(year=parsed.year - 100)
+    return parsed.replace(tzinfo=timezone.utc)
+
+def format_time(data, item, parsed):
+    return parsed.isoformat() if parsed else time_text(data, item)
+
+def parse_certificate(der):
+    # только нужные поля x.509: субъект, издатель, срок действия и subjectAltName
+    certificate = der_children(der, next(der_items(der)))
+    tbs = der_children(der, certificate[0])
+    if tbs[0][0] == 0xa0:
+        tbs = tbs[1:]
+    serial, _, issuer, validity, subject = tbs[:5]
+    not_before, not_after = der_children(der, validity)[:2]
+    
+    sans = []
+    ip_sans = []
+    for item in tbs[6:]:
+        if item[0] != 0xa3:
+            continue
+        for extension in der_children(der, der_children(der, item)[0]):
+            parts = der_children(der, extension)
+            if decode_oid(der[parts[0][1]:parts[0][2]]) != OID_SUBJECT_ALT_NAME:
+                continue
+            value = parts[-1]
+            names = next(der_items(der, value[1], value[2]))
+            for tag, start, end in der_items(der, names[1], names[2]):
+                if tag == TAG_DNS_NAME:
+                    sans.append(der[start:end].decode('ascii', errors='replace'))
+                elif tag == TAG_IP_ADDRESS:
+                    ip_sans.append(str(ipaddress.ip_address(der[start:end])))
+    
+    subject_name = parse_name(der, subject)
+    issuer_name = parse_name(der, issuer)
+    not_before_time = parse_time(der, not_before)
+    not_after_time = parse_time(der, not_after)
+    return {
+        "subject": subject_name,
+        "issuer": issuer_name,
+        "common_name": subject_name.get("CN"),
+        "issuer_name": issuer_name.get("CN") or issuer_name.get("O"),
+        "serial": der[serial[1]:serial[2]].hex(),
+        "not_before": format_time(der, not_before, not_before_time),
+        "not_after": format_time(der, not_after, not_after_time),
+        "expired": not_after_time < datetime.now(timezone.utc) if not_after_time else None,
+        "self_signed": der[subject[1]:subject[2]] == der[issuer[1]:issuer[2]],
+        "sans": sans,
+        "ip_sans": ip_sans
+    }
+
+def looks_like_hostname(name):
+    return bool(name) and "." in name and " " not in name
+
+class CertificateStore:
+    # один сертификат часто отдают десятки портов и адресов (балансировщик, wildcard):
+    # разбираем его один раз по отпечатку sha256, дальше только добавляем точки, где он встретился
+    def __init__(self):
+        self.certificates = {}
+        self.endpoints = {}
+        self.hostnames = set()
+    
+    def add(self, der, endpoint):
+        fingerprint = hashlib.sha256(der).hexdigest()
+        certificate = self.certificates.get(fingerprint)
+        if certificate is None:
+            try:
+                certificate = parse_certificate(der)
+            except (IndexError, ValueError, StopIteration):
+                certificate = {"error": "не удалось разобрать сертификат", "sans": []}
+            self.certificates[fingerprint] = certificate
+            names = certificate["sans"] + [certificate.get("common_name")]
+            self.hostnames.update(name.lower().removeprefix("*.") for name in names if looks_like_hostname(name))
+        self.endpoints.setdefault(fingerprint, []).append(endpoint)
+        return fingerprint, certificate
+    
+    def new_hostnames(self, known=()):
+        known = {name.lower() for name in known}
+        return sorted(name for name in self.hostnames if name not in known)
+
+def get_context():
+    # сертификат не проверяем: нужен любой, включая самоподписанные и просроченные
+    global _context
+    if _context is None:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        try:
+            context.minimum_version = ssl.TLSVersion.MINIMUM_SUPPORTED
+            context.set_ciphers("ALL:@SECLEVEL=0")
+        except (ValueError, ssl.SSLError):
+            pass
+        _context = context
+    return _context
+
+def server_name_for(target):
+    # sni отправляется только для доменного имени, для ip-адреса его нет
+    try:
+        ipaddress.ip_address(target)
+        return None
+    except ValueError:
+        return target
+
+async def tls_probe(host, port, server_name=None, timeout=3, store=None):
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port, ssl=get_context(), server_hostname=server_name or "", ssl_handshake_timeout=timeout),
+            timeout=timeout
+        )
+    except (OSError, asyncio.TimeoutError):
+        return None
+    
+    try:
+        ssl_object = writer.get_extra_info("ssl_object")
+        der = ssl_object.getpeercert(binary_form=True)
+        cipher, _, bits = ssl_object.cipher()
+        version = ssl_object.version()
+    finally:
+        writer.close()
+    
+    result = {"version": version, "cipher": cipher, "bits": bits, "server_name": server_name, "fingerprint": None, "certificate": None}
+    if der:
+        store = store if store is not None else CertificateStore()
+        result["fingerprint"], result["certificate"] = store.add(der, f"{host}:{port}")
+    return result
@@ -0,0 +1,220 @@
+import asyncio
+import socket
+import struct
+import sys
+from datetime import datetime
+from tools.osint import port_scaner, port_spec, service_table
+
+# на linux ошибки icmp для неподключенного udp сокета приходят в очередь ошибок (IP_RECVERR + MSG_ERRQUEUE)
+IP_RECVERR = getattr(socket, "IP_RECVERR", 11)
+IPV6_RECVERR = getattr(socket, "IPV6_RECVERR", 25)
+SO_EE_ORIGIN_ICMP = 2
+SO_EE_ORIGIN_ICMP6 = 3
+ICMP_DEST_UNREACH = 3
+ICMP_PORT_UNREACH = 3
+ICMP6_DEST_UNREACH = 1
+ICMP6_PORT_UNREACH = 4
+
+DNS_STATUS_QUERY = b"\x13\x37\x01\x00\x00\x01\x00\x00\x00\x00\x00\x00\x00\x00\x02\x00\x01"
+MDNS_SERVICES_QUERY = (b"\x00\x00\x00\x00\x00\x01\x00\x00\x00\x00\x00\x00"
+                       b"\x09_services\x07_dns-sd\x04_udp\x05local\x00\x00\x0c\x00\x01")
+
+UDP_PROBES = {
+    53: DNS_STATUS_QUERY,
+    69: b"\x00\x01r7tftp.txt\x00octet\x00",
+    123: b"\x1b" + b"\x00" * 47,
+    137: b"\x80\xf0\x00\x10\x00\x01\x00\x00\x00\x00\x00\x00\x20CKAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA\x00\x00\x21\x00\x01",
+    161: (b"\x30\x29\x02\x01\x00\x04\x06public\xa0\x1c\x02\x04\x71\x3f\x2d\x01\x02\x01\x00\x02\x01\x00"
+          b"\x30\x0e\x30\x0c\x06\x08\x2b\x06\x01\x02\x01\x01\x01\x00\x05\x00"),
+    1900: (b"M-SEARCH * HTTP/1.1\r\nHOST: 239.255.255.250:1900\r\n"
+           b"MAN: \"ssdp:discover\"\r\nMX: 1\r\nST: ssdp:all\r\n\r\n"),
+    5060: (b"OPTIONS sip:nm SIP/2.0\r\nVia: SIP/2.0/UDP nm;branch=z9hG4bK-lpt\r\n"
+           b"From: <sip:nm@nm>;tag=root\r\nTo: <sip:nm2@nm2>\r\nCall-ID: 50000\r\n"
+           b"CSeq: 42 OPTIONS\r\nMax-Forwards: 70\r\nContent-Length: 0\r\n\r\n"),
+    5353: MDNS_SERVICES_QUERY,
+    11211: b"\x00\x01\x00\x00\x00\x01\x00\x00version\r\n",
+}
+DEFAULT_PROBE = b""
+
+def probe_for_port(port):
+    return UDP_PROBES.get(port, DEFAULT_PROBE)
+
+def printable_response(data, limit=120):
+    text = data[:limit].decode('latin-1')
+    return "".join(c if 32 <= ord(c) < 127 or c in "\r\n" else "." for c in text).strip()
+
+class UdpScan:
+    # несколько общих сокетов на весь скан: ответ сопоставляется с портом по адресу источника,
+    # icmp port unreachable - по адресу назначения из очереди ошибок
+    def __init__(self, ip, sockets=4, rate=500, retries=1, timeout=1):
+        self.ip = ip
+        self.family = socket.AF_INET6 if ":" in ip else socket.AF_INET
+        self.socket_count = sockets
+        self.limiter = port_scaner.TokenBucket(rate)
+        self.retries = retries
+        self.timeout = timeout
+        self.recv_errors = sys.platform.startswith("linux")
+        self.sockets = []
+        self.status = {}
+        self.results = asyncio.Queue()
+    
+    def open_sockets(self):
+        loop = asyncio.get_running_loop()
+        for _ in range(self.socket_count):
+            sock = socket.socket(self.family, socket.SOCK_DGRAM)
+            sock.setblocking(False)
+            if self.recv_errors:
+                try:
+                    if self.family == socket.AF_INET6:
+                        sock.setsockopt(socket.IPPROTO_IPV6, IPV6_RECVERR, 1)
+                    else:
+                        sock.setsockopt(socket.SOL_IP, IP_RECVERR, 1)
+                except OSError:
+                    self.recv_errors = False
+            loop.add_reader(sock, self.on_readable, sock)
+            self.sockets.append(sock)
+    
+    def close_sockets(self):
+        loop = asyncio.get_running_loop()
+        for sock in self.sockets:
+            loop.remove_reader(sock)
+            sock.close()
+        self.sockets = []
+    
+    def resolve(self, port, status, response=None):
+        if self.status.get(port) != "pending":
+            return
+        self.status[port] = status
+        self.results.put_nowait((port, status, response))
+    
+    def on_readable(self, sock):
+        for _ in range(256):
+            try:
+                data, addr = sock.recvfrom(65535)
+            except BlockingIOError:
+                break
+            except OSError:
+                self.drain_errors(sock)
+                continue
+            if addr[0] == self.ip:
+                self.resolve(addr[1], "open", data)
+    
+    def drain_errors(self, sock):
+        if not self.recv_errors:
+            return
+        while True:
+            try:
+                _, ancdata, _, addr = sock.recvmsg(512, 512, socket.MSG_ERRQUEUE)
+            except OSError:
+                break
+            for _, _, data in ancdata:
+                if len(data) < 8 or not addr or addr[0] != self.ip:
+                    continue
+                _, origin, icmp_type, icmp_code = struct.unpack_from("=IBBB", data)
+                # у icmpv6 свои номера: destination unreachable - 1, port unreachable - код 4
+                if self.family == socket.AF_INET6:
+                    unreach, port_unreach = (SO_EE_ORIGIN_ICMP6, ICMP6_DEST_UNREACH), ICMP6_PORT_UNREACH
+                else:
+                    unreach, port_unreach = (SO_EE_ORIGIN_ICMP, ICMP_DEST_UNREACH), ICMP_PORT_UNREACH
+                if (origin, icmp_type) != unreach:
+                    continue
+                self.resolve(addr[1], "closed" if icmp_code == port_unreach else "filtered")
+    
+    def send(self, port):
+        sock = self.sockets[port % len(self.sockets)]
+        for _ in range(2):
+            try:
+                sock.sendto(probe_for_port(port), (self.ip, port))
+                return
+            except BlockingIOError:
+                return
+            except OSError:
+                # ошибка от прошлого icmp всплывает на следующем системном вызове
+                self.drain_errors(sock)
+    
+    async def send_all(self, ports):
+        for attempt in range(self.retries + 1):
+            for port in ports:
+                if attempt == 0:
+                    self.status[port] = "pending"
+                elif self.status.get(port) != "pending":
+                    continue
+                while not self.limiter.try_acquire():
+                    await asyncio.sleep(self.limiter.delay())
+                self.send(port)
+            await asyncio.sleep(self.timeout)
+        
+        for port, status in self.status.items():
+            if status == "pending":
+                self.status[port] = "open|filtered"
+        self.results.put_nowait(None)
+    
+    async def run(self, ports):
+        self.open_sockets()
+        sender = asyncio.create_task(self.send_all(ports))
+        try:
+            while True:
+                result = await self.results.get()
+                if result is None:
+                    break
+                yield result
+        finally:
+            sender.cancel()
+            await asyncio.gather(sender, return_exceptions=True)
+            self.close_sockets()
+
+async def iter_udp_scan(ip, ports, sockets=4, rate=500, retries=1, timeout=1, stats=None):
+    scan = UdpScan(ip, sockets, rate, retries, timeout)
+    async for port, status, response in scan.run(ports):
+        port_scaner.count_status(stats, status)
+        if status != "open":
+            continue
+        yield {
+            "port": port,
+            "service": service_table.service_name(port, "udp"),
+            "banner": printable_response(response) or None,
+            "status": status
+        }
+    
+    if stats is not None:
+        stats["open|filtered"] = sum(1 for s in scan.status.values() if s == "open|filtered")
+
+async def udp_port_scan(target, port_range="udp-top100", sockets=4, rate=500, retries=1, timeout=1, on_open=None):
+    ip = await port_scaner.resolve_ip(target)
+    if ip is None:
+        return {
+            "error": f"не удалось разрешить домен: {target}",
+            "target": target,
+            "resolved_ip": None
+        }
+    
+    start_time = datetime.now()
+    ports = port_spec.parse_ports(port_range)
+    stats = {}
+    open_ports = []
+    
+    async for port_info in iter_udp_scan(ip, ports, sockets, rate, retries, timeout, stats):
+        open_ports.append(port_info)
+        if on_open:
+            on_open(port_info)
+    
+    open_ports.sort(key=lambda p: p["port"])
+    end_time = datetime.now()
+    
+    return {
+        "target": target,
+        "resolved_ip": ip,
+        "resolved_from": target if target != ip else None,
+        "proto": "udp",
+        "scan_time": (end_time - start_time).total_seconds(),
+        "total_ports": len(ports),
+        "open_ports_count": len(open_ports),
+        "open_ports": open_ports,
+        "closed_count": stats.get("closed", 0),
+        "filtered_count": stats.get("filtered", 0),
+        "open_filtered_count": stats.get("open|filtered", 0),
+        "timestamp": datetime.now().isoformat()
+    }
+
+def run_udp_scanner(target, port_range="udp-top100", sockets=4, rate=500, retries=1, timeout=1, on_open=None):
+    return asyncio.run(udp_port_scan(target, port_range, sockets, rate, retries, timeout, on_open))
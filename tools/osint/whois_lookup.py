@@ -1,30 +1,264 @@
-import socket
+import asyncio
+import itertools
+import json
+import os
+import re
+import sqlite3
+import time
 
-def whois_lookup(domain, whois_server="whois.iana.org", port=43):
-    try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(10)
-        sock.connect((whois_server, port))
-        sock.send(f"{domain}\r\n".encode())
+IANA_SERVER = "whois.iana.org"
+WHOIS_PORT = 43
+DEFAULT_CACHE_PATH = "results/whois.db"
+RESPONSE_TTL = 24 * 3600
+REFERRAL_TTL = 30 * 24 * 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS referrals (
+    tld TEXT PRIMARY KEY,
+    server TEXT NOT NULL,
+    seen REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS responses (
+    domain TEXT PRIMARY KEY,
+    server TEXT NOT NULL,
+    seen REAL NOT NULL,
+    raw TEXT NOT NULL
+);
+"""
+
+# ключевые поля у разных реестров называются по-разному
+FIELD_KEYS = {
+    "registrar": ["registrar", "sponsoring registrar", "registrar name"],
+    "created": ["creation date", "created", "created on", "registered on", "registration time", "domain registration date"],
+    "expires": ["registry expiry date", "registrar registration expiration date", "expiration date", "expiry date", "paid-till", "expires", "expires on"],
+    "updated": ["updated date", "last updated", "last modified", "changed"],
+    "registrant": ["registrant organization", "registrant", "org", "organisation"],
+    "status": ["domain status", "status", "state"],
+    "name_servers": ["name server", "nserver", "nameservers", "name servers"],
+}
+LIST_FIELDS = {"status", "name_servers"}
+FIELD_BY_KEY = {key: field for field, keys in FIELD_KEYS.items() for key in keys}
+LINE_RE = re.compile(r"^\s*([A-Za-z][\w ./-]*?)\s*:\s*(.+?)\s*$", re.MULTILINE)
+# lookbehind не дает начинать совпадение с середины слова: без него длинные строки без "@" разбираются за O(n^2)
+EMAIL_RE = re.compile(r"(?<![\w.+-])[\w.+-]+@[\w-]+\.[\w.-]+")
+
+class WhoisCache:
+    # реферралы tld -> сервер живут долго, ответы - сутки; оба переживают перезапуск
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=RESPONSE_TTL, referral_ttl=REFERRAL_TTL):
+        self.ttl = ttl
+        self.referral_ttl = referral_ttl
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    def close(self):
+        if self.db:
+            self.db.commit()
+            self.db.close()
+            self.db = None
+    
+    def get_referral(self, tld):
+        row = self.db.execute("SELECT server FROM referrals WHERE tld = ? AND seen > ?", (tld, time.time() - self.referral_ttl)).fetchone()
+        return row[0] if row else None
+    
+    def put_referral(self, tld, server):
+        self.db.execute("INSERT OR REPLACE INTO referrals VALUES (?, ?, ?)", (tld, server, time.time()))
+        self.db.commit()
+    
+    def get_response(self, domain):
+        row = self.db.execute("SELECT server, raw FROM responses WHERE domain = ? AND seen > ?", (domain, time.time() - self.ttl)).fetchone()
+        return row if row else None
+    
+    def put_response(self, domain, server, raw):
+        self.db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)", (domain, server, time.time(), raw))
+    
+    def commit(self):
+        self.db.commit()
+
+def parse_fields(raw):
+    fields = {}
+    for key, value in LINE_RE.findall(raw):
+        field = FIELD_BY_KEY.get(key.lower())
+        if field is None:
+            continue
+        if field in LIST_FIELDS:
+            values = fields.setdefault(field, [])
+            value = value.split()[0].lower() if field == "name_servers" else value
+            if value not in values:
+                values.append(value)
+        elif field not in fields:
+            fields[field] = value
+    
+    emails = sorted(set(EMAIL_RE.findall(raw)))
+    if emails:
+        fields["emails"] = emails
+    return fields
+
+def find_referral(raw):
+    for line in raw.splitlines():
+        key, _, value = line.partition(":")
+        if key.strip().lower() in ("refer", "whois") and value.strip():
+            return value.strip()
+    return None
+
+class WhoisClient:
+    # на каждый whois-сервер свой семафор: реестры режут клиентов, которые держат много соединений
+    def __init__(self, cache=None, per_server=4, timeout=10, port=WHOIS_PORT):
+        self.cache = cache
+        self.per_server = per_server
+        self.timeout = timeout
+        self.port = port
+        self.limits = {}
+        self.referrals = {}
+    
+    async def query(self, server, text):
+        limit = self.limits.setdefault(server, asyncio.Semaphore(self.per_server))
+        async with limit:
+            async with asyncio.timeout(self.timeout):
+                reader, writer = await asyncio.open_connection(server, self.port)
+                try:
+                    writer.write(f"{text}\r\n".encode())
+                    await writer.drain()
+                    # ответ копится списком кусков и склеивается один раз
+                    chunks = []
+                    while chunk := await reader.read(65536):
+                        chunks.append(chunk)
+                finally:
+                    writer.close()
+        return b"".join(chunks).decode('utf-8', errors='ignore')
+    
+    async def referral_server(self, tld):
+        # одновременные запросы доменов одной зоны ждут один и тот же запрос к iana
+        server = self.cache.get_referral(tld) if self.cache else None
+        if server:
+            return server
+        
+        task = self.referrals.get(tld)
+        if task is None:
+            task = asyncio.ensure_future(self.query(IANA_SERVER, tld))
+            self.referrals[tld] = task
+        try:
+            raw = await asyncio.shield(task)
+        except (OSError, asyncio.TimeoutError):
+            self.referrals.pop(tld, None)
+            raise
         
-        response = b""
-        while True:
-            data = sock.recv(4096)
-            if not data:
-                break
-            response += data
+        server = find_referral(raw) or IANA_SERVER
+        if self.cache:
+            self.cache.put_referral(tld, server)
+        return server
+    
+    async def lookup(self, domain, server=None):
+        domain = domain.strip().lower().rstrip(".")
+        result = {"domain": domain, "server": server, "cached": False, "raw": None, "fields": {}, "error": None}
         
-        sock.close()
-        result = response.decode('utf-8', errors='ignore')
+        cached = self.cache.get_response(domain) if self.cache and server is None else None
+        if cached:
+            result.update(server=cached[0], raw=cached[1], fields=parse_fields(cached[1]), cached=True)
+            return result
         
-        if whois_server == "whois.iana.org":
-            for line in result.split('\n'):
-                if "refer:" in line.lower():
-                    referral = line.split(":")[1].strip()
-                    if referral:
-                        return whois_lookup(domain, referral)
+        try:
+            if server is None:
+                server = await self.referral_server(domain.rsplit(".", 1)[-1])
+                result["server"] = server
+            raw = await self.query(server, domain)
+        except asyncio.TimeoutError:
+            result["error"] = f"таймаут запроса к {server or IANA_SERVER}"
+            return result
+        except OSError as e:
+            result["error"] = f"ошибка запроса к {server or IANA_SERVER}: {e.strerror or e}"
+            return result
         
+        result["raw"] = raw
+        result["fields"] = parse_fields(raw)
+        if self.cache and raw:
+            self.cache.put_response(domain, server, raw)
         return result
-    except Exception:
-        return "Ошибка запроса"
-    
\ No newline at end of file
+
+def iter_domains(domains):
+    # список, строка через запятую или @файл с доменом на строку; файл читается лениво
+    if isinstance(domains, str):
+        domains = domains.split(",")
+    for entry in domains:
+        entry = entry.strip()
+        if not entry or entry.startswith("#"):
+            continue
+        # как iter_targets в port_scaner: несуществующий @файл - ошибка OSError, а не домен "@файл"
+        if entry.startswith("@"):
+            with open(entry[1:], 'r', encoding='utf-8') as f:
+                yield from iter_domains(f)
+            continue
+        yield entry
+
+async def iter_bulk_lookup(domains, max_concurrent=50, per_server=4, cache=None, timeout=10):
+    # общее окно из max_concurrent доменов, внутри него - не больше per_server соединений на сервер
+    client = WhoisClient(cache, per_server, timeout)
+    domains = iter_domains(domains)
+    pending = {asyncio.create_task(client.lookup(d)) for d in itertools.islice(domains, max_concurrent)}
+    
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for domain in itertools.islice(domains, len(done)):
+                pending.add(asyncio.create_task(client.lookup(domain)))
+            for task in done:
+                yield task.result()
+            if cache:
+                cache.commit()
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+async def bulk_lookup(domains, max_concurrent=50, per_server=4, cache=None, on_result=None, output=None):
+    # output - путь jsonl: каждая строка пишется сразу, с сырым текстом и разобранными полями
+    results = []
+    out = open(output, 'w', encoding='utf-8') if output else None
+    try:
+        async for result in iter_bulk_lookup(domains, max_concurrent, per_server, cache):
+            results.append(result)
+            if out:
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                out.flush()
+            if on_result:
+                on_result(result)
+    finally:
+        if out:
+            out.close()
+    return results
+
+def print_whois_result(result):
+    if result["error"]:
+        print(f"  [-] {result['domain']}: {result['error']}")
+        return
+    fields = result["fields"]
+    cached = " [кэш]" if result["cached"] else ""
+    print(f"  [+] {result['domain']}{cached}: {fields.get('registrar', '-')}, создан {fields.get('created', '-')}, истекает {fields.get('expires', '-')}")
+
+def run_bulk_lookup(domains, max_concurrent=50, per_server=4, output=None, cache_path=DEFAULT_CACHE_PATH):
+    with WhoisCache(cache_path) as cache:
+        return asyncio.run(bulk_lookup(domains, max_concurrent, per_server, cache, print_whois_result, output))
+
+def whois_lookup(domain, whois_server=IANA_SERVER, port=WHOIS_PORT, cache_path=DEFAULT_CACHE_PATH):
+    # через iana сервер зоны определяется сам (и берется из кэша); явно указанный сервер опрашивается напрямую
+    server = None if whois_server == IANA_SERVER else whois_server
+    
+    async def run(cache):
+        return await WhoisClient(cache, port=port).lookup(domain, server)
+    
+    with WhoisCache(cache_path) as cache:
+        result = asyncio.run(run(cache))
+    if result["error"]:
+        return f"Ошибка запроса: {result['error']}"
+    return result["raw"]